@@ -1,46 +1,19 @@
 import os
 import json
 import shutil
-import requests
-import asyncio
-import edge_tts
-from transformers import pipeline
-from diffusers import StableDiffusionPipeline
-from moviepy.editor import ImageClip, concatenate_videoclips, AudioFileClip
 import time
-from datetime import datetime
-import torch
-import numpy as np
-import gradio as gr
-import cv2
-from accelerate import Accelerator
-from pydub import AudioSegment
-
-# Directories to clean or create
-OUTPUT_JSON_DIR = "output_json"
-TTS_OUTPUT_DIR = "tts_output"
-IMAGES_OUTPUT_DIR = "output_images"
-ORGANIZED_ASSETS_DIR = "organized_assets"
-FINAL_VIDEO_DIR = "final_output"
-SAVED_PROJECTS_DIR = "saved_projects"
-SILENT_MP3_PATH = "path_to_silence.mp3"
-
-# Ensure the saved projects directory exists
-if not os.path.exists(SAVED_PROJECTS_DIR):
-    os.makedirs(SAVED_PROJECTS_DIR)
-
-# Function to create silent MP3 if it doesn't exist
-def create_silent_audio_if_not_exists(duration_ms=5000, path=SILENT_MP3_PATH):
-    if not os.path.exists(path):
-        print(f"Silent MP3 does not exist, creating {path}...", flush=True)
-        silence = AudioSegment.silent(duration=duration_ms)
-        silence.export(path, format="mp3")
-        print(f"Silent MP3 created at {path}", flush=True)
-    else:
-        print(f"Silent MP3 already exists at {path}", flush=True)
-
-# Call the function at the start of the script to ensure the silent audio file exists
-create_silent_audio_if_not_exists()
+from llm_client import LLM_CLIENT
+from asset_manifest import write_atomically
+from encoding_profiles import PROFILES, get_profile, default_profile_name
+from model_registry import warm_up_models
+from story_model import Story
+from job_queue import JOB_QUEUE, MAX_ACTIVE_JOBS
+from job_journal import JobJournal
+from stitch import archive_project, start_story_render, prune_stale_assets, render_story_assets
+from tracing import start_metrics_server
+
+# Each run works in its own job workspace (see job_queue.py) and is archived to the shared store (see archive_store.py).
+# The rendering stages are shared with stitch.py, which renders existing story files.
 
 # Clean up directories at the start to avoid mix-ups from old files
 def cleanup_directories(directories):
@@ -58,42 +31,8 @@ def cleanup_directories(directories):
         else:
             os.makedirs(directory)
 
-# Step to archive the project files after video creation
-def archive_project(json_story_path):
-    print("Archiving project files...", flush=True)
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    project_folder = os.path.join(SAVED_PROJECTS_DIR, f"project_{timestamp}")
-    
-    os.makedirs(project_folder, exist_ok=True)
-    
-    # Create subdirectories for assets and final output
-    assets_dir = os.path.join(project_folder, "assets")
-    final_video_dir = os.path.join(project_folder, "final_video")
-    os.makedirs(assets_dir, exist_ok=True)
-    os.makedirs(final_video_dir, exist_ok=True)
-    
-    # Copy story JSON
-    shutil.copy(json_story_path, project_folder)
-    
-    # Copy assets (images, audio)
-    for file_name in os.listdir(ORGANIZED_ASSETS_DIR):
-        shutil.copy(os.path.join(ORGANIZED_ASSETS_DIR, file_name), assets_dir)
-    
-    # Copy final video(s)
-    for file_name in os.listdir(FINAL_VIDEO_DIR):
-        shutil.copy(os.path.join(FINAL_VIDEO_DIR, file_name), final_video_dir)
-    
-    print(f"Project archived in {project_folder}", flush=True)
-
-# Step 1: Story Creation Node using Local AI Server
-def generate_story(prompt, model='gpt-3.5-turbo', seed=42):
-    print("Starting story generation with local AI server...", flush=True)
-    start_time = time.time()
-
-    # Cleanup directories before generating
-    cleanup_directories([OUTPUT_JSON_DIR, TTS_OUTPUT_DIR, IMAGES_OUTPUT_DIR, ORGANIZED_ASSETS_DIR, FINAL_VIDEO_DIR])
-
-    # Story creation using the local server
+# Prompt asking the local AI server for a story in the JSONAV schema
+def build_story_prompt(prompt):
     ai_prompt = f"""
     You are an AI tasked with generating a story in JSON format. The story should be structured according to the following schema:
     
@@ -131,341 +70,197 @@ def generate_story(prompt, model='gpt-3.5-turbo', seed=42):
 
     Story prompt: "{prompt}"
     """
-
-    # Send request to the local AI server
-    response = requests.post(
-        "http://localhost:1234/v1/chat/completions",
-        json={
-            "model": model,
-            "messages": [{"role": "user", "content": ai_prompt}],
-            "temperature": 0.7,
-            "user": {"id": f"user-{seed}"}
-        }
-    )
-
-    # Parse the response from the local AI server
-    response_json = response.json()
-    story_json = response_json["choices"][0]["message"]["content"]
-
-    # Save structured story as a JSON file
-    json_story_path = os.path.join(OUTPUT_JSON_DIR, 'story.json')
-    with open(json_story_path, 'w') as json_file:
-        json.dump(json.loads(story_json), json_file, indent=4)
-
-    print(f"Story generation completed in {time.time() - start_time:.2f} seconds.", flush=True)
+    return ai_prompt
+
+def story_request_payload(prompt, model='gpt-3.5-turbo', seed=42):
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": build_story_prompt(prompt)}],
+        "temperature": 0.7,
+        "user": {"id": f"user-{seed}"}
+    }
+
+# Save the structured story as the job's story.json; it is written atomically and journaled, so a
+# resumed job can render it instead of asking the server again
+def save_story(story, workspace):
+    json_story_path = os.path.join(workspace.json_dir, 'story.json')
+
+    def write(tmp_path):
+        with open(tmp_path, 'w') as json_file:
+            json.dump(story, json_file, indent=4)
+
+    write_atomically(json_story_path, write)
+    workspace.journal.complete("story", json_story_path)
     return json_story_path
 
-# Step 2: Generate TTS and Image Prompts
-async def generate_tts_and_prompts(json_story_path):
-    print("Starting TTS and image prompt generation...", flush=True)
-    start_time = time.time()
-
-    with open(json_story_path, 'r') as f:
-        story = json.load(f)
-
-    # Define TTS voices
-    voice_type_male = "en-US-GuyNeural"
-    voice_type_female = "en-US-AriaNeural"
-    voice_type_narration = "en-US-JennyNeural"
-
-    text_prompts = []
-
-    # TTS generation for narration and actor dialogues
-    for scene in story['scenes']:
-        scene_number = scene['scene_number']
-
-        # Generate and move the narration TTS
-        print(f"Generating narration TTS for scene {scene['scene_number']}...", flush=True)
-        narration_audio_path = f"{TTS_OUTPUT_DIR}/scene_{scene_number:02d}_narration.mp3"
-        narration_tts = edge_tts.Communicate(scene['narration'], voice_type_narration)
-        await narration_tts.save(narration_audio_path)
-
-        # Move narration TTS to organized_assets
-        organized_narration_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_narration.mp3"
-        shutil.move(narration_audio_path, organized_narration_path)
-
-        for actor in scene['actors_in_scene']:
-            actor_name = actor.get('name', 'Unknown').replace(" ", "_").lower()
-            print(f"Generating TTS for actor {actor_name} in scene {scene['scene_number']}...", flush=True)
-
-            actor_voice_type = actor.get('voice_type', 'Male')
-            actor_voice = voice_type_male if actor_voice_type == "Male" else voice_type_female
-
-            actor_dialogue = actor.get('dialogue', "No dialogue")
-            actor_audio_path = f"{TTS_OUTPUT_DIR}/scene_{scene_number:02d}_{actor_name}.mp3"
-            dialogue_tts = edge_tts.Communicate(actor_dialogue, actor_voice)
-            await dialogue_tts.save(actor_audio_path)
-
-            # Move actor dialogue TTS to organized_assets
-            organized_dialogue_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_{actor_name}.mp3"
-            shutil.move(actor_audio_path, organized_dialogue_path)
-
-            # Fetch the actor's description from the main actors list
-            actor_description = story['actors'][0]['description']
-            print(f"Using description: {actor_description}")
-
-            # Add actor description as prompt for image generation
-            text_prompts.append(f"Portrait of {actor['name']}, {actor_description}")
-
-        # Add scene description to prompts for image generation
-        text_prompts.append(scene['description'])
-
-    print(f"TTS and image prompt generation completed in {time.time() - start_time:.2f} seconds.", flush=True)
-    return text_prompts
-
-
-# image generation
-def generate_and_organize_images(json_story_path):
-    print("Starting image generation and organization based on story.json...", flush=True)
-    start_time = time.time()
-
-    # Load the Stable Diffusion model with acceleration
-    accelerator = Accelerator()
-    pipe = StableDiffusionPipeline.from_pretrained("stabilityai/stable-diffusion-2-1", torch_dtype=torch.float16)
-    pipe = pipe.to(accelerator.device)
-
-    # Load the story JSON to access scene numbers and prompts
-    with open(json_story_path, 'r') as f:
-        story = json.load(f)
-
-    # Iterate through scenes in the story to generate images
-    for scene in story['scenes']:
-        scene_number = scene['scene_number']
-
-        # Generate the scene description image
-        scene_description = scene['description']
-        scene_image_name = f"scene_{scene_number:02d}_description.png"
-        print(f"Generating scene image for scene {scene_number}: {scene_description}")
-        
-        # Generate the scene image
-        with accelerator.autocast():
-            scene_image = pipe(scene_description).images[0]
-        
-        # Save and move the scene image to organized assets
-        scene_image_path = f"{IMAGES_OUTPUT_DIR}/{scene_image_name}"
-        scene_image.save(scene_image_path)
-        shutil.move(scene_image_path, f"{ORGANIZED_ASSETS_DIR}/{scene_image_name}")
-        print(f"Scene image saved as {scene_image_name}")
-
-        # Generate and move actor portrait images for each actor in the scene
-        for actor in scene['actors_in_scene']:
-            actor_name = actor['name'].replace(" ", "_").lower()
-            actor_description = next((a['description'] for a in story['actors'] if a['name'] == actor['name']), None)
-
-            if actor_description:
-                actor_portrait_prompt = f"Portrait of {actor['name']}, {actor_description}"
-                actor_image_name = f"scene_{scene_number:02d}_{actor_name}_portrait.png"
-                print(f"Generating actor portrait for {actor['name']}: {actor_description}")
-
-                # Generate the actor portrait image
-                with accelerator.autocast():
-                    actor_image = pipe(actor_portrait_prompt).images[0]
-
-                # Save and move the actor portrait to organized assets
-                actor_image_path = f"{IMAGES_OUTPUT_DIR}/{actor_image_name}"
-                actor_image.save(actor_image_path)
-                shutil.move(actor_image_path, f"{ORGANIZED_ASSETS_DIR}/{actor_image_name}")
-                print(f"Actor portrait saved as {actor_image_name}")
-
-    print(f"Image generation and organization completed in {time.time() - start_time:.2f} seconds.", flush=True)
-
-
-# Custom Screen Shake Effect Class and Function
-class Screen:
-    def __init__(self):
-        self.x = 0
-        self.y = 0
-        self.shaking = False
-        self.shake_duration = 0
-        self.shake_intensity = 0
-        self.shake_counter = 0
-
-    def shake(self, duration, intensity):
-        self.shaking = True
-        self.shake_duration = duration
-        self.shake_intensity = intensity
-        self.shake_counter = 0
-
-    def update_shake(self, delta_time):
-        if not self.shaking:
-            return
-
-        if self.shake_counter >= self.shake_duration:
-            self.shaking = False
-            self.shake_intensity = 0
-            self.shake_counter = 0
-            self.shake_duration = 0
-            self.x = 0
-            self.y = 0
-            return
-
-        shake_x = (np.random.uniform(-0.5, 0.5)) * self.shake_intensity
-        shake_y = (np.random.uniform(-0.5, 0.5)) * self.shake_intensity
-
-        self.x += shake_x
-        self.y += shake_y
-
-        self.shake_intensity *= 0.995
-
-        self.shake_counter += delta_time
-
-def apply_screen_shake(clip, screen, fps=24, intensity=5):
-    duration = clip.duration
-    screen.shake(duration=duration, intensity=intensity)
-    
-    def shake_frame(get_frame, t):
-        frame = get_frame(t)
-        screen.update_shake(1/fps)
-        height, width, _ = frame.shape
-        
-        zoom_factor = 1.15  # Increased zoom to prevent edge visibility
-        zoomed_frame = cv2.resize(frame, (0, 0), fx=zoom_factor, fy=zoom_factor)
-
-        translation_matrix = np.float32([[1, 0, screen.x], [0, 1, screen.y]])
-        shaken_frame = cv2.warpAffine(zoomed_frame, translation_matrix, (width, height))
-        
-        return shaken_frame
-    
-    return clip.fl(shake_frame)
+# Step 1: Story Creation Node using Local AI Server
+def generate_story(prompt, workspace, model='gpt-3.5-turbo', seed=42):
+    print("Starting story generation with local AI server...", flush=True)
+    with workspace.tracer.span("generate_story", "llm", log="Story generation"):
+        # Send request to the local AI server, asking again if the answer is not valid story JSON
+        story = LLM_CLIENT.generate_story(story_request_payload(prompt, model, seed))
+        json_story_path = save_story(story, workspace)
+    return json_story_path
 
-# Step 5: Stitch assets and ensure the narration and actor audio are properly layered
+# Step 1 (streaming): consume the server's token stream and hand off the actors and each scene as soon as they are complete
+def generate_story_streaming(prompt, workspace, on_actors=None, on_scene=None, model='gpt-3.5-turbo', seed=42):
+    print("Starting streaming story generation with local AI server...", flush=True)
+    with workspace.tracer.span("generate_story", "llm", streaming=True, log="Streaming story generation"):
+        story = LLM_CLIENT.stream_story(story_request_payload(prompt, model, seed), on_actors=on_actors, on_scene=on_scene)
+        json_story_path = save_story(story, workspace)
+    return json_story_path
 
-# Stitch assets and ensure the narration and actor audio are properly layered
-def stitch_assets(json_story_path, apply_shake_effect=False):
-    print("Starting video stitching with proper audio layering...", flush=True)
+# Generate several stories at the throughput the local server supports, one prompt per line.
+# Each story is saved as output_json/story_XX.json in the batch's job workspace, ready to be rendered with stitch.py.
+def generate_story_batch(prompts_text, model='gpt-3.5-turbo', seed=42):
+    prompts = [line.strip() for line in prompts_text.splitlines() if line.strip()]
+    print(f"Starting batch generation of {len(prompts)} stories...", flush=True)
     start_time = time.time()
 
-    with open(json_story_path, 'r') as file:
-        story = json.load(file)
-
-    scene_clips = []
-
-    # Iterate through each scene
-    for scene in story['scenes']:
-        scene_number = scene['scene_number']
-        print(f"Stitching scene {scene_number}...", flush=True)
-
-        # Load the scene description image
-        image_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_description.png"
-        if not os.path.exists(image_path):
-            print(f"[ERROR] Scene image not found: {image_path}")
-            continue
-
-        # Load the narration audio
-        narration_audio_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_narration.mp3"
+    payloads = [story_request_payload(prompt, model, seed + index) for index, prompt in enumerate(prompts)]
+    json_story_paths = []
+    with JOB_QUEUE.job() as workspace:
+        for index, story in enumerate(LLM_CLIENT.generate_stories(payloads), start=1):
+            if isinstance(story, Exception):
+                print(f"[ERROR] Story {index} failed: {story}", flush=True)
+                continue
+            json_story_path = os.path.join(workspace.json_dir, f'story_{index:02d}.json')
+            with open(json_story_path, 'w') as json_file:
+                json.dump(story, json_file, indent=4)
+            json_story_paths.append(json_story_path)
+
+    print(f"Batch story generation completed in {time.time() - start_time:.2f} seconds.", flush=True)
+    return json_story_paths
+
+# Stream the story and start TTS and images for each scene while later scenes are still being written
+def stream_and_render_story(story_prompt, workspace, apply_shake_effect=False, tts_backend=None, profile=None):
+    print("Starting streaming story generation and scheduled rendering...", flush=True)
+    with workspace.tracer.span("stream_and_render_story", "job", log="Streaming pipeline"):
+        scheduler, builder, cleanup = start_story_render(workspace, apply_shake_effect, tts_backend, profile)
+
+        # The story model grows with the stream, so the finished story is never parsed again
+        story = Story()
+
+        # Scenes that arrive before the cast wait for it, since it decides their voices and portraits
+        def on_actors(actors):
+            story.set_actors(actors)
+            builder.cast_ready()
+
+        def produce_story():
+            json_story_path = generate_story_streaming(
+                story_prompt, workspace, on_actors=on_actors,
+                on_scene=lambda scene: builder.add_scene(story.add_scene(scene)))
+            prune_stale_assets(story, workspace)
+            builder.close()
+            return json_story_path
+
+        scheduler.add("story", produce_story, pool="llm")
         try:
-            if os.path.exists(narration_audio_path):
-                # Try to load the narration audio to get its duration
-                narration_audio_clip = AudioFileClip(narration_audio_path)
-                scene_duration = narration_audio_clip.duration
-                print(f"Setting scene duration to match narration length: {scene_duration} seconds")
+            results = scheduler.run()
+        finally:
+            cleanup()
+    return results["story"], results["final"]
+
+# Main pipeline function; every run gets its own job workspace, so concurrent users never share files.
+# encoding_profile names one of PROFILES (draft, balanced, archival); None uses the default profile.
+# resume_job_id continues a failed or interrupted job (see job_journal.py) with the settings it was
+# started with: a story already written is not requested again, and the lines, images and scene
+# segments it finished are reused.
+def run_pipeline(story_prompt, apply_shake, stream_story_generation="yes", encoding_profile=None, resume_job_id=""):
+    print("Pipeline started.", flush=True)
+    resume_job_id = (resume_job_id or "").strip()
+    if resume_job_id:
+        # The id comes from the UI: only a job folder directly under the jobs root can be resumed
+        if os.path.basename(resume_job_id) != resume_job_id or resume_job_id in (".", ".."):
+            raise ValueError(f"Invalid job id {resume_job_id!r}")
+        journal = JobJournal(os.path.join(JOB_QUEUE.root, resume_job_id))
+        if not journal.exists():
+            raise ValueError(f"No job {resume_job_id} to resume in {JOB_QUEUE.root}")
+        if journal.get("kind") != "prompt":
+            raise ValueError(f"Job {resume_job_id} renders {journal.get('story_path')}: render that story file again to resume it")
+        print(f"Resuming job {resume_job_id}...", flush=True)
+        settings = {}
+    else:
+        settings = {"kind": "prompt", "story_prompt": story_prompt, "apply_shake": apply_shake,
+                    "stream_story_generation": stream_story_generation, "encoding_profile": get_profile(encoding_profile).name}
+
+    with JOB_QUEUE.job(resume_job_id or None) as workspace:
+        with workspace.journal.running(**settings) as journal:
+            story_prompt = journal.get("story_prompt")
+            apply_shake_effect = journal.get("apply_shake").lower() == 'yes'
+            encoding_profile = journal.get("encoding_profile")
+
+            json_story_path = journal.stage("story")
+            final_video_path = journal.stage("final")
+            if final_video_path and os.path.exists(final_video_path):
+                print(f"Final video of job {workspace.job_id} already written", flush=True)
+            elif json_story_path and os.path.exists(json_story_path):
+                final_video_path = render_story_assets(Story.load(json_story_path), workspace, apply_shake_effect,
+                                                       profile=encoding_profile)
+            elif journal.get("stream_story_generation").lower() == 'yes':
+                json_story_path, final_video_path = stream_and_render_story(story_prompt, workspace, apply_shake_effect,
+                                                                            profile=encoding_profile)
             else:
-                raise FileNotFoundError(f"Narration audio file {narration_audio_path} not found.")
-        except Exception as e:
-            # If there's any issue with the narration audio, fallback to silent audio
-            print(f"[ERROR] Narration audio error for scene {scene_number}: {e}. Using silent audio.")
-            scene_duration = 5  # Set a default duration for the scene
-            narration_audio_clip = AudioFileClip("path_to_silence.mp3").set_duration(scene_duration)
-
-        # Create the scene image clip with the same duration as the narration
-        scene_image_clip = ImageClip(image_path).set_duration(scene_duration)
-        scene_image_clip = scene_image_clip.set_audio(narration_audio_clip)
-
-        # Apply shake effect to the scene image clip if enabled
-        if apply_shake_effect:
-            print("Applying shake effect to scene image...")
-            screen = Screen()
-            scene_image_clip = apply_screen_shake(scene_image_clip, screen, intensity=5)  # Set shake intensity here
-
-        # List to hold the actor dialogue clips
-        actor_clips = []
-
-        # Add each actor's dialogue with their portrait
-        for actor in scene['actors_in_scene']:
-            actor_name = actor['name'].replace(" ", "_").lower()
-
-            # Load the actor's portrait
-            actor_image_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_{actor_name}_portrait.png"
-            if not os.path.exists(actor_image_path):
-                print(f"[ERROR] Actor portrait not found: {actor_image_path}")
-                continue
-
-            # Load the actor's dialogue audio
-            actor_audio_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_{actor_name}.mp3"
-            try:
-                if os.path.exists(actor_audio_path):
-                    # Try to load the dialogue audio to get its duration
-                    actor_audio_clip = AudioFileClip(actor_audio_path)
-                    dialogue_duration = actor_audio_clip.duration
-                    print(f"Setting actor portrait duration to match dialogue length: {dialogue_duration} seconds")
-                else:
-                    raise FileNotFoundError(f"Dialogue audio file {actor_audio_path} not found.")
-            except Exception as e:
-                # If there's any issue with the actor dialogue audio, fallback to silent audio
-                print(f"[ERROR] Dialogue audio error for {actor_name} in scene {scene_number}: {e}. Using silent audio.")
-                dialogue_duration = 5  # Set a default duration for actor portrait
-                actor_audio_clip = AudioFileClip("path_to_silence.mp3").set_duration(dialogue_duration)
-
-            # Create the actor portrait image clip with the same duration as the dialogue
-            actor_image_clip = ImageClip(actor_image_path).set_duration(dialogue_duration)
-            actor_image_clip = actor_image_clip.set_audio(actor_audio_clip)
-
-            # Apply shake effect to the actor portrait clip if enabled
-            if apply_shake_effect:
-                print("Applying shake effect to actor clip...")
-                screen = Screen()
-                actor_image_clip = apply_screen_shake(actor_image_clip, screen, intensity=5)  # Set shake intensity here
-
-            # Add actor clip to the list
-            actor_clips.append(actor_image_clip)
-
-        # Concatenate actor clips after the scene image
-        if actor_clips:
-            # Concatenate all actor dialogue clips
-            actor_sequence_clip = concatenate_videoclips(actor_clips)
-            final_scene_clip = concatenate_videoclips([scene_image_clip, actor_sequence_clip])
-        else:
-            final_scene_clip = scene_image_clip
-
-        # Add the stitched scene clip to the list of scene clips
-        scene_clips.append(final_scene_clip)
+                json_story_path = generate_story(story_prompt, workspace)
+                final_video_path = render_story_assets(Story.load(json_story_path), workspace, apply_shake_effect,
+                                                       profile=encoding_profile)
+            journal.complete("final", final_video_path)
 
-    # Concatenate all the scenes into the final video
-    final_video_path = f"{FINAL_VIDEO_DIR}/final_story_video_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.mp4"
-    final_video = concatenate_videoclips(scene_clips)
-    final_video.write_videofile(final_video_path, fps=24)
-
-    print(f"Video stitching completed in {time.time() - start_time:.2f} seconds.", flush=True)
-    return final_video_path
+            # Archive the project files, then drop the staging files and segments of this job
+            if not journal.stage("archive"):
+                archive_project(json_story_path, workspace, final_video_path)
+                journal.complete("archive")
+                cleanup_directories([workspace.tts_dir, workspace.segments_dir])
 
-# Main pipeline function
-def run_pipeline(story_prompt, apply_shake):
-    print("Pipeline started.", flush=True)
-    json_story_path = generate_story(story_prompt)
-    text_prompts = asyncio.run(generate_tts_and_prompts(json_story_path))
-    generate_and_organize_images(json_story_path)  # Use the correct function
-    final_video_path = stitch_assets(json_story_path, apply_shake.lower() == 'yes')
-    
-    # Archive the project files
-    archive_project(json_story_path)
-    
     return final_video_path
 
 
 # Gradio Interface
-with gr.Blocks() as demo:
-    gr.Markdown("# 🎬 Story to Video Generator")
-    gr.Markdown("Enter a prompt, and the pipeline will generate a video with narration and images based on the story.")
-
-    with gr.Row():
-        with gr.Column():
-            story_prompt = gr.Textbox(label="Enter Story Prompt", placeholder="Once upon a time in a faraway land...", lines=5)
-            apply_shake = gr.Radio(choices=["yes", "no"], label="Apply shake effect?", value="no")
-            submit_button = gr.Button("Generate Video 🎥")
-        with gr.Column():
-            video_output = gr.Video(label="Generated Story Video")
-
-    submit_button.click(fn=run_pipeline, inputs=[story_prompt, apply_shake], outputs=video_output)
-
-# Launch the app
-demo.launch()
+def build_ui():
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.Markdown("# 🎬 Story to Video Generator")
+        gr.Markdown("Enter a prompt, and the pipeline will generate a video with narration and images based on the story.")
+
+        with gr.Row():
+            with gr.Column():
+                story_prompt = gr.Textbox(label="Enter Story Prompt", placeholder="Once upon a time in a faraway land...", lines=5)
+                apply_shake = gr.Radio(choices=["yes", "no"], label="Apply shake effect?", value="no")
+                stream_story_generation = gr.Radio(choices=["yes", "no"], label="Start rendering scenes while the story is being written?", value="yes")
+                encoding_profile = gr.Dropdown(choices=list(PROFILES), label="Encoding profile", value=default_profile_name())
+                resume_job_id = gr.Textbox(label="Resume job (optional)", placeholder="Job id listed by python job_journal.py", lines=1)
+                submit_button = gr.Button("Generate Video 🎥")
+            with gr.Column():
+                video_output = gr.Video(label="Generated Story Video")
+
+        submit_button.click(fn=run_pipeline, inputs=[story_prompt, apply_shake, stream_story_generation, encoding_profile, resume_job_id],
+                            outputs=video_output)
+
+        gr.Markdown("## 📚 Batch story generation")
+        gr.Markdown("Write one prompt per line to generate several story.json files at once, then render them with stitch.py.")
+
+        with gr.Row():
+            with gr.Column():
+                batch_prompts = gr.Textbox(label="Story Prompts (one per line)", lines=5)
+                batch_button = gr.Button("Generate Stories 📝")
+            with gr.Column():
+                batch_output = gr.File(label="Generated Story Files", file_count="multiple")
+
+        batch_button.click(fn=generate_story_batch, inputs=[batch_prompts], outputs=batch_output)
+
+    return demo
+
+
+# Launch the app, loading the diffusion model(s) in the background meanwhile; up to MAX_ACTIVE_JOBS users are served at once.
+# Importing this module only defines the pipeline stages: no web server, model or heavy library is loaded.
+def main():
+    warm_up_models()
+    start_metrics_server()
+    demo = build_ui()
+    demo.queue(concurrency_count=MAX_ACTIVE_JOBS)
+    demo.launch()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+# Archived projects, plus the content-addressed blobs their files are linked to
+SAVED_PROJECTS_DIR = os.environ.get("JSONAV_SAVED_PROJECTS_DIR", "saved_projects")
+BLOBS_DIR_NAME = ".blobs"
+PROJECT_MANIFEST = "project_manifest.json"
+
+# Linux FICLONE ioctl: a copy-on-write clone on filesystems that support it (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink(src_path, dest_path):
+    import fcntl
+    with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+        fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+
+
+# Reflink, else copy: the result always has its own inode, so later writes to the source never reach it
+def clone_or_copy(src_path, dest_path):
+    try:
+        reflink(src_path, dest_path)
+        return
+    except (ImportError, OSError):
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+    shutil.copyfile(src_path, dest_path)
+
+
+# Hardlink, else reflink, else copy: archived files cost no extra disk wherever the filesystem allows it
+def link_clone_or_copy(src_path, dest_path):
+    try:
+        os.link(src_path, dest_path)
+        return
+    except OSError:
+        pass
+    clone_or_copy(src_path, dest_path)
+
+
+# Each unique file is stored once under <root>/.blobs by its sha256; a project folder is made of
+# links to those blobs plus a project_manifest.json mapping its files to their digests.
+# Blobs that no manifest references anymore are removed by collect_garbage().
+class ArchiveStore:
+    def __init__(self, root=SAVED_PROJECTS_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, BLOBS_DIR_NAME)
+        self._digests = {}  # (device, inode, size, mtime) -> digest, so unchanged files are hashed once
+        self._lock = threading.Lock()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def digest(self, path):
+        stat = os.stat(path)
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = file_digest(path)
+        return self._digests[key]
+
+    # Add a file to the store unless an identical blob is already there; call with the lock held.
+    # Never hardlinks: the source may be a story file or workspace asset that is edited in place later.
+    def _put(self, src_path, digest):
+        blob_path = self._blob_path(digest)
+        if os.path.exists(blob_path):
+            return blob_path
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = f"{blob_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        clone_or_copy(src_path, tmp_path)
+        os.replace(tmp_path, blob_path)
+        return blob_path
+
+    # Archive {relative path: source file} as the project folder <root>/<project_name>
+    def archive(self, project_name, files):
+        project_folder = os.path.join(self.root, project_name)
+        digests = {rel_path: self.digest(src_path) for rel_path, src_path in files.items()}
+
+        with self._lock:
+            for rel_path, src_path in files.items():
+                blob_path = self._put(src_path, digests[rel_path])
+                dest_path = os.path.join(project_folder, rel_path)
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                if os.path.exists(dest_path):
+                    os.remove(dest_path)
+                link_clone_or_copy(blob_path, dest_path)
+
+            manifest = {"created": datetime.now().isoformat(timespec='seconds'), "files": digests}
+            manifest_path = os.path.join(project_folder, PROJECT_MANIFEST)
+            tmp_path = f"{manifest_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=4, sort_keys=True)
+            os.replace(tmp_path, manifest_path)
+        return project_folder
+
+    def projects(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isfile(os.path.join(self.root, name, PROJECT_MANIFEST)))
+
+    def referenced_blobs(self):
+        referenced = set()
+        for name in self.projects():
+            try:
+                with open(os.path.join(self.root, name, PROJECT_MANIFEST), 'r') as f:
+                    referenced.update(json.load(f)["files"].values())
+            except (OSError, ValueError, KeyError) as e:
+                # An unreadable manifest would make its blobs look unreferenced; keep everything instead
+                raise RuntimeError(f"Cannot read the manifest of project {name}: {e}") from e
+        return referenced
+
+    # Delete blobs that no project references anymore (after project folders were removed).
+    # Returns (blobs removed, bytes freed).
+    def collect_garbage(self, dry_run=False):
+        removed = 0
+        freed = 0
+        with self._lock:
+            referenced = self.referenced_blobs()
+            if not os.path.isdir(self.blob_dir):
+                return removed, freed
+            for prefix in os.listdir(self.blob_dir):
+                prefix_dir = os.path.join(self.blob_dir, prefix)
+                for name in os.listdir(prefix_dir):
+                    if name in referenced:
+                        continue
+                    path = os.path.join(prefix_dir, name)
+                    freed += os.path.getsize(path)
+                    removed += 1
+                    if not dry_run:
+                        os.remove(path)
+                if not dry_run and not os.listdir(prefix_dir):
+                    os.rmdir(prefix_dir)
+        return removed, freed
+
+
+ARCHIVE_STORE = ArchiveStore()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the saved_projects archive store.")
+    parser.add_argument("command", choices=["gc", "list"], help="gc: delete blobs no project uses; list: show archived projects")
+    parser.add_argument("--root", default=SAVED_PROJECTS_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="Report what gc would delete without deleting it")
+    args = parser.parse_args(argv)
+
+    store = ArchiveStore(args.root)
+    if args.command == "list":
+        for name in store.projects():
+            print(name)
+        return 0
+
+    removed, freed = store.collect_garbage(dry_run=args.dry_run)
+    action = "Would remove" if args.dry_run else "Removed"
+    print(f"{action} {removed} unreferenced blobs ({freed / 1024 ** 2:.1f} MB)", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+MANIFEST_FILE_NAME = "asset_manifest.json"
+
+
+# Hash of everything that went into producing an asset (text, voice, prompt, model settings...)
+def asset_input_hash(*parts):
+    payload = json.dumps(parts, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Produce a file under a temporary name next to `path` with write(tmp_path), then rename it into
+# place, so a crash never leaves a partial file under the real name
+def write_atomically(path, write):
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+# Copy (or move) a finished file into an asset directory atomically. A move within one file
+# system is a plain rename; otherwise the file is copied under a temporary name first.
+def place_asset(src_path, dest_path, move=False):
+    if move:
+        try:
+            os.replace(src_path, dest_path)
+            return dest_path
+        except OSError:
+            pass
+    write_atomically(dest_path, lambda tmp_path: shutil.copyfile(src_path, tmp_path))
+    if move:
+        os.remove(src_path)
+    return dest_path
+
+
+# A JSON object kept in a file and rewritten atomically on every change; subclasses hold `_lock`
+# while they touch `entries` and call _save() after changing them
+class JsonStore:
+    # What happens when the file cannot be read, for the error message
+    unreadable = "Starting from scratch."
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] Could not read {self.path}: {e}. {self.unreadable}", flush=True)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+# Records the input hash behind every file in an asset directory, so a re-run only
+# regenerates files whose inputs changed and reuses everything else
+class AssetManifest(JsonStore):
+    unreadable = "Rebuilding all assets."
+
+    def __init__(self, asset_dir, file_name=MANIFEST_FILE_NAME):
+        self.asset_dir = asset_dir
+        super().__init__(os.path.join(asset_dir, file_name))
+
+    # The input hash a file was recorded with, or None
+    def input_hash(self, file_name):
+        with self._lock:
+            return self.entries.get(file_name)
+
+    def is_current(self, file_name, input_hash):
+        with self._lock:
+            if self.entries.get(file_name) != input_hash:
+                return False
+        return os.path.exists(os.path.join(self.asset_dir, file_name))
+
+    def record(self, file_name, input_hash):
+        with self._lock:
+            self.entries[file_name] = input_hash
+            self._save()
+
+    def forget(self, file_name):
+        with self._lock:
+            if self.entries.pop(file_name, None) is not None:
+                self._save()
+
+    # Forget a file whose inputs changed and delete it, so nothing uses the outdated asset meanwhile
+    def discard(self, file_name):
+        with self._lock:
+            if self.entries.pop(file_name, None) is not None:
+                self._save()
+            path = os.path.join(self.asset_dir, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Remove assets that the current story no longer produces
+    def prune(self, expected_file_names):
+        expected = set(expected_file_names)
+        with self._lock:
+            for file_name in list(self.entries):
+                if file_name in expected:
+                    continue
+                del self.entries[file_name]
+                path = os.path.join(self.asset_dir, file_name)
+                if os.path.exists(path):
+                    print(f"Removing stale asset {file_name}", flush=True)
+                    os.remove(path)
+            self._save()
+
+
+_MANIFESTS = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+# One shared manifest object per asset directory in this process
+def get_asset_manifest(asset_dir):
+    key = os.path.abspath(asset_dir)
+    with _MANIFESTS_LOCK:
+        if key not in _MANIFESTS:
+            _MANIFESTS[key] = AssetManifest(asset_dir)
+        return _MANIFESTS[key]
@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Memory kept for decoded assets, and threads writing asset files in the background
+ASSET_STORE_MB = float(os.environ.get("JSONAV_ASSET_STORE_MB", "512"))
+ASSET_WRITERS = int(os.environ.get("JSONAV_ASSET_WRITERS", "2"))
+
+
+# Decoded assets handed from the stage that produced them to the stage that consumes them within
+# this process: the RGB array of every generated image and the PCM of synthesized lines, keyed by the
+# path their file has in organized_assets. Files are written by background writers off the critical
+# path; consumers that read the file itself (ffmpeg, render worker processes, the archive) wait for
+# it with wait() or flush(). Arrays are dropped least recently used first beyond the memory budget,
+# and consumers fall back to decoding the file, so the store only ever saves work.
+class AssetStore:
+    def __init__(self, max_mb=ASSET_STORE_MB, writers=ASSET_WRITERS):
+        self.max_bytes = int(max_mb * 1024 ** 2)
+        self.writers = max(1, writers)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._pending = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def put(self, path, data):
+        key = os.path.abspath(path)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            if data.nbytes > self.max_bytes:
+                return
+            self._entries[key] = data
+            self._bytes += data.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    # The decoded asset, or None when it was never handed over or has been evicted
+    def get(self, path):
+        key = os.path.abspath(path)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return data
+
+    # Run write() on a background writer; it produces the files at `paths`, which wait() and flush() wait for
+    def persist(self, paths, write):
+        keys = [os.path.abspath(path) for path in paths]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.writers, thread_name_prefix="asset_writer")
+            future = self._executor.submit(write)
+            for key in keys:
+                self._pending[key] = future
+        future.add_done_callback(lambda done: self._settle(keys, done))
+        return future
+
+    def _settle(self, keys, future):
+        with self._lock:
+            for key in keys:
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+
+    # Whether the asset exists, in memory, being written or on disk
+    def exists(self, path):
+        key = os.path.abspath(path)
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return True
+        return os.path.exists(path)
+
+    # Wait until the file at path is written; raises the writer's error if it failed
+    def wait(self, path):
+        with self._lock:
+            future = self._pending.get(os.path.abspath(path))
+        if future is not None:
+            future.result()
+        return path
+
+    # Wait for every pending write under directory (all of them by default), raising the first error
+    def flush(self, directory=None):
+        prefix = os.path.join(os.path.abspath(directory), "") if directory else ""
+        with self._lock:
+            futures = {future for key, future in self._pending.items() if key.startswith(prefix)}
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    # Drop the decoded assets under directory once its job no longer needs them
+    def release(self, directory):
+        prefix = os.path.join(os.path.abspath(directory), "")
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._bytes -= self._entries.pop(key).nbytes
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+
+ASSET_STORE = AssetStore()
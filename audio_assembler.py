@@ -0,0 +1,78 @@
+import wave
+import subprocess
+
+import numpy as np
+
+from still_encoder import ffmpeg_binary, AUDIO_SAMPLE_RATE
+
+AUDIO_CHANNELS = 2
+
+
+# Decode an audio file to 16-bit PCM frames, or None if ffmpeg cannot read it.
+# The ffmpeg process has exited before this returns, so nothing stays open.
+def decode_pcm(path, sample_rate=AUDIO_SAMPLE_RATE, channels=AUDIO_CHANNELS):
+    cmd = [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-i", path,
+           "-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-ac", str(channels), "-"]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        return None
+    usable = len(result.stdout) - len(result.stdout) % (2 * channels)
+    return np.frombuffer(result.stdout[:usable], dtype=np.int16).reshape(-1, channels)
+
+
+# PCM frames a segment of `duration` seconds gets, so audio and video agree on segment boundaries
+def segment_frame_count(duration, sample_rate=AUDIO_SAMPLE_RATE):
+    return int(round(duration * sample_rate))
+
+
+# The PCM of one segment: exactly segment_frame_count(duration) frames of its decoded line, cut or
+# padded with silence, or only silence when audio_path is None or unreadable. With an asset store, a
+# line decoded when it was synthesized is taken from it.
+def segment_pcm(audio_path, duration, sample_rate=AUDIO_SAMPLE_RATE, channels=AUDIO_CHANNELS, store=None):
+    frame_count = segment_frame_count(duration, sample_rate)
+    buffer = np.zeros((frame_count, channels), dtype=np.int16)
+    if audio_path:
+        pcm = None
+        if store is not None and sample_rate == AUDIO_SAMPLE_RATE and channels == AUDIO_CHANNELS:
+            pcm = store.get(audio_path)
+        if pcm is None:
+            pcm = decode_pcm(audio_path, sample_rate, channels)
+        if pcm is None:
+            print(f"[ERROR] Could not decode {audio_path}. Using silence.", flush=True)
+        else:
+            used = min(frame_count, len(pcm))
+            buffer[:used] = pcm[:used]
+    return buffer
+
+
+# The soundtrack of (image_path, audio_path, duration) segments as one contiguous PCM buffer
+def assemble_pcm(segments, sample_rate=AUDIO_SAMPLE_RATE, channels=AUDIO_CHANNELS):
+    frame_counts = [segment_frame_count(duration, sample_rate) for _, _, duration in segments]
+    buffer = np.zeros((sum(frame_counts), channels), dtype=np.int16)
+
+    position = 0
+    for (_, audio_path, duration), frame_count in zip(segments, frame_counts):
+        buffer[position:position + frame_count] = segment_pcm(audio_path, duration, sample_rate, channels)
+        position += frame_count
+    return buffer
+
+
+def write_wav(buffer, path, sample_rate=AUDIO_SAMPLE_RATE):
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(buffer.shape[1])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(buffer.tobytes())
+    return path
+
+
+# Write the whole soundtrack of the segments to a single WAV for the encoder, one segment at a
+# time, so only a single line is ever decoded in memory however long the story is
+def write_soundtrack(segments, output_path, sample_rate=AUDIO_SAMPLE_RATE, channels=AUDIO_CHANNELS, store=None):
+    with wave.open(output_path, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        for _, audio_path, duration in segments:
+            wav_file.writeframes(segment_pcm(audio_path, duration, sample_rate, channels, store).tobytes())
+    return output_path
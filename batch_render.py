@@ -0,0 +1,162 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import stitch
+from job_queue import MAX_ACTIVE_JOBS
+from model_registry import warm_up_models
+from tts_backends import TTS_BACKEND, TTS_BACKENDS, get_tts_backend
+from encoding_profiles import PROFILES, get_profile
+
+# Headless renderer for many existing story.json files, built on stitch.py's scheduled pipeline.
+# Models, caches and the TTS backend stay resident for the whole batch, and up to --workers stories
+# run at once: their stages share the process-wide diffusion and encode slots, so one story's images
+# are generated while another one's scenes are encoded.
+#
+#   python batch_render.py stories/                      every *.json file in a directory
+#   python batch_render.py "stories/**/story.json"       a glob (quote it so the shell leaves it alone)
+#   python batch_render.py a.json b.json --shake --workers 2
+
+
+def find_story_files(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "*.json")))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            print(f"[ERROR] No story file or directory at {pattern}", flush=True)
+            matches = []
+        paths.extend(path for path in matches if os.path.isfile(path))
+
+    # The same file given twice would only wait for its own workspace
+    seen = set()
+    unique = []
+    for path in paths:
+        if os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            unique.append(path)
+    return unique
+
+
+# Busy seconds of every span name recorded by a job's tracer; spans that overlap (concurrent TTS
+# lines, scene encodes) add up, so these can exceed the job's wall time
+def span_seconds(tracer):
+    totals = {}
+    for event in list(tracer.events):
+        if event["name"] != "job":
+            totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"] / 1e6
+    return {name: round(seconds, 3) for name, seconds in sorted(totals.items())}
+
+
+def render_one(json_story_path, apply_shake_effect, tts_backend, archive, profile):
+    print(f"Batch: rendering {json_story_path}", flush=True)
+    start_time = time.time()
+    result = {"story": json_story_path, "status": "ok", "final_video": None, "error": None}
+    try:
+        final_video_path, workspace = stitch.render_story_file(json_story_path, apply_shake_effect, tts_backend, archive, profile)
+        result["final_video"] = final_video_path
+        result["job_id"] = workspace.job_id
+        result["stages"] = span_seconds(workspace.tracer)
+        job_spans = [event for event in workspace.tracer.events if event["name"] == "job"]
+        if job_spans:
+            result["job_seconds"] = round(job_spans[0]["dur"] / 1e6, 3)
+    except Exception as e:
+        print(f"[ERROR] Batch: {json_story_path} failed: {type(e).__name__}: {e}", flush=True)
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["wall_seconds"] = round(time.time() - start_time, 3)
+    if "job_seconds" in result:
+        # Time spent waiting for a job slot or for an earlier render of the same workspace
+        result["queued_seconds"] = round(max(0.0, result["wall_seconds"] - result["job_seconds"]), 3)
+    return result
+
+
+# Render every story with up to `workers` of them in flight; returns the batch summary
+def render_batch(story_paths, apply_shake_effect=False, workers=MAX_ACTIVE_JOBS, tts_backend=None, archive=True, profile=None):
+    started = datetime.now()
+    start_time = time.time()
+    tts_backend = tts_backend or get_tts_backend()
+    profile = get_profile(profile)
+    done = []
+    lock = threading.Lock()
+
+    def render(path):
+        result = render_one(path, apply_shake_effect, tts_backend, archive, profile)
+        with lock:
+            done.append(result)
+            print(f"Batch: {len(done)}/{len(story_paths)} done ({result['status']}, {result['wall_seconds']:.2f} seconds): {path}", flush=True)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as executor:
+        results = list(executor.map(render, story_paths))
+
+    wall_seconds = time.time() - start_time
+    return {
+        "started": started.isoformat(timespec='seconds'),
+        "wall_seconds": round(wall_seconds, 3),
+        "workers": workers,
+        "shake": apply_shake_effect,
+        "tts_backend": tts_backend.name,
+        "encoding_profile": profile.name,
+        "succeeded": sum(result["status"] == "ok" for result in results),
+        "failed": sum(result["status"] != "ok" for result in results),
+        "stories": results,
+    }
+
+
+def write_summary(summary, path):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=4)
+    os.replace(tmp_path, path)
+    return path
+
+
+def print_summary(summary):
+    print(f"{'story':<48}{'status':>8}{'wall s':>10}{'queued s':>10}", flush=True)
+    for result in summary["stories"]:
+        queued = f"{result['queued_seconds']:.2f}" if "queued_seconds" in result else "-"
+        print(f"{result['story'][-48:]:<48}{result['status']:>8}{result['wall_seconds']:>10.2f}{queued:>10}", flush=True)
+    print(f"{summary['succeeded']} succeeded, {summary['failed']} failed in {summary['wall_seconds']:.2f} seconds", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render story.json files to videos without the Gradio UI.")
+    parser.add_argument("stories", nargs="+", help="Story files, directories of *.json stories, or glob patterns")
+    parser.add_argument("--shake", action="store_true", help="Apply the shake effect")
+    parser.add_argument("--workers", type=int, default=MAX_ACTIVE_JOBS, help="Stories rendered at once")
+    parser.add_argument("--tts-backend", choices=sorted(TTS_BACKENDS), default=TTS_BACKEND)
+    parser.add_argument("--profile", choices=list(PROFILES), default=None, help="Encoding profile (default: the calibrated one, else balanced)")
+    parser.add_argument("--no-archive", action="store_true", help="Leave the results in the job folders only")
+    parser.add_argument("--summary", default=None, help="Where to write the JSON summary (default: batch_summary_<time>.json)")
+    args = parser.parse_args(argv)
+
+    story_paths = find_story_files(args.stories)
+    if not story_paths:
+        print("[ERROR] No story files found.", flush=True)
+        return 1
+    print(f"Batch: {len(story_paths)} stories, {args.workers} at once", flush=True)
+
+    # Start loading the diffusion model while the first stories synthesize their speech
+    warm_up_models()
+    summary = render_batch(story_paths, args.shake, args.workers, get_tts_backend(args.tts_backend), not args.no_archive, args.profile)
+
+    summary_path = args.summary or f"batch_summary_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    write_summary(summary, summary_path)
+    print_summary(summary)
+    print(f"Summary written to {summary_path}", flush=True)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,572 @@
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+import statistics
+import platform
+import subprocess
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from encoding_profiles import PROFILES, CALIBRATION_PATH, FALLBACK_PROFILE, get_profile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Offline end-to-end benchmark: renders a synthetic story through stitch.py's scheduled pipeline with
+# stand-in TTS and diffusion backends, so no LM Studio, edge-tts or GPU is needed, then compares the
+# measurements against a stored baseline.
+#
+#   python benchmark.py story out.json --scenes 20     write a synthetic story.json
+#   python benchmark.py run --repeat 3                 measure and compare against the baseline
+#   python benchmark.py run --save-baseline            measure and store the result as the new baseline
+#   python benchmark.py calibrate --story story.json    pick the encoding profile for this machine
+
+BASELINE_PATH = "benchmark_baseline.json"
+REGRESSION_THRESHOLD = 0.2
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+# Calibration targets: lowest mean PSNR (dB) of the encoded stills, and optionally a size budget
+DEFAULT_MIN_PSNR = 40.0
+
+# Metrics where a higher value is better, and ones that are only reported; every other metric is a cost
+HIGHER_IS_BETTER = {"stitch_fps"}
+INFORMATIONAL = {"video_seconds"}
+
+FIRST_NAMES = ["Ada", "Bram", "Cora", "Dov", "Esme", "Finn", "Gale", "Hugo", "Iris", "Jory"]
+WORDS = ("the a old quiet storm lantern harbor forest city night morning river tower stranger secret "
+         "map door letter road bridge market shadow light voice window garden train ship mountain "
+         "walks finds waits listens runs remembers opens hides watches follows whispers laughs").split()
+
+
+def synthetic_text(rng, word_count):
+    words = [rng.choice(WORDS) for _ in range(max(1, word_count))]
+    return " ".join(words).capitalize() + "."
+
+
+# A story in the README schema with the given number of scenes, actors and words per line
+def synthetic_story(scenes=10, actors=3, actors_per_scene=2, line_words=20, seed=0):
+    rng = random.Random(seed)
+    cast = []
+    for index in range(actors):
+        name = FIRST_NAMES[index % len(FIRST_NAMES)]
+        if index >= len(FIRST_NAMES):
+            name = f"{name} {index // len(FIRST_NAMES) + 1}"
+        cast.append({
+            "name": name,
+            "description": synthetic_text(rng, line_words),
+            "voice_type": "Male" if index % 2 == 0 else "Female",
+        })
+
+    story_scenes = []
+    for scene_number in range(1, scenes + 1):
+        in_scene = rng.sample(cast, min(actors_per_scene, len(cast)))
+        story_scenes.append({
+            "scene_number": scene_number,
+            "description": synthetic_text(rng, line_words),
+            "narration": synthetic_text(rng, line_words),
+            "actors_in_scene": [{"name": actor["name"], "dialogue": synthetic_text(rng, line_words)} for actor in in_scene],
+        })
+
+    return {
+        "story_title": f"Synthetic benchmark story ({scenes} scenes)",
+        "author": "benchmark.py",
+        "genre": "Benchmark",
+        "style": "Synthetic",
+        "actors": cast,
+        "scenes": story_scenes,
+    }
+
+
+# Stand-in for a diffusers pipeline: waits latency_seconds per image and returns a cheap
+# deterministic picture for every prompt
+class StubDiffusionPipeline:
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+
+    def __call__(self, prompts, num_inference_steps=50, height=768, width=768, generator=None, **kwargs):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds * len(prompts))
+        images = []
+        for prompt in prompts:
+            rng = np.random.default_rng(zlib.crc32(prompt.encode("utf-8")))
+            tiles = rng.integers(0, 256, size=(48, 48, 3), dtype=np.uint8)
+            images.append(Image.fromarray(tiles).resize((width, height), Image.NEAREST))
+        return SimpleNamespace(images=images)
+
+
+# Stand-in for an accelerate Accelerator: runs on the CPU without autocast, so neither accelerate
+# nor torch is imported
+class StubAccelerator:
+    device = "cpu"
+
+    def autocast(self):
+        return contextlib.nullcontext()
+
+
+# Samples open file descriptors and live child processes of this process while the benchmark runs.
+# Both are read from /proc and reported as None where it does not exist.
+class ResourceSampler:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_open_files = None
+        self.peak_child_processes = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="benchmark-sampler")
+
+    @staticmethod
+    def open_files():
+        try:
+            return len(os.listdir("/proc/self/fd"))
+        except OSError:
+            return None
+
+    @staticmethod
+    def child_processes():
+        try:
+            children = 0
+            for task in os.listdir("/proc/self/task"):
+                with open(f"/proc/self/task/{task}/children", "r") as f:
+                    children += len(f.read().split())
+            return children
+        except OSError:
+            return None
+
+    def _sample(self):
+        for attribute, value in (("peak_open_files", self.open_files()), ("peak_child_processes", self.child_processes())):
+            if value is not None:
+                setattr(self, attribute, max(value, getattr(self, attribute) or 0))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 ** 2 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+# Wall time of each stage (tts, images, scene, final), from the first task start to the last task end
+def stage_wall_times(spans):
+    stages = {}
+    for name, (start, end) in spans.items():
+        stage = name.split(":")[0]
+        first, last = stages.get(stage, (start, end))
+        stages[stage] = (min(first, start), max(last, end))
+    return {stage: end - start for stage, (start, end) in stages.items()}
+
+
+# Keep every cache, job workspace and archive of the run inside work_dir; must happen before the
+# pipeline modules are imported, as they read their directories at import time
+def configure_environment(work_dir):
+    os.environ["JSONAV_IMAGE_CACHE_DIR"] = os.path.join(work_dir, "image_cache")
+    os.environ["JSONAV_TTS_CACHE_DIR"] = os.path.join(work_dir, "tts_cache")
+    os.environ["JSONAV_JOBS_DIR"] = os.path.join(work_dir, "jobs")
+    os.environ["JSONAV_SAVED_PROJECTS_DIR"] = os.path.join(work_dir, "saved_projects")
+
+
+# One measured run in this process: the scheduled pipeline, then stitch_assets alone on the finished assets
+def single_run(config, work_dir):
+    configure_environment(work_dir)
+    import stitch
+    from job_queue import JOB_QUEUE, story_job_id
+    from model_registry import MODEL_REGISTRY, DEFAULT_MODEL_ID
+    from still_encoder import probe_duration
+    from story_model import Story
+    from timeline import get_timeline
+    from tts_backends import ToneTTSBackend
+
+    story_data = synthetic_story(config["scenes"], config["actors"], config["actors_per_scene"], config["line_words"], config["seed"])
+    json_story_path = os.path.join(work_dir, "story.json")
+    with open(json_story_path, 'w') as f:
+        json.dump(story_data, f, indent=4)
+    story = Story.from_dict(story_data)
+
+    MODEL_REGISTRY.register(DEFAULT_MODEL_ID, StubDiffusionPipeline(config["diffusion_latency"]))
+    MODEL_REGISTRY.register_accelerator(StubAccelerator())
+    tts_backend = ToneTTSBackend(duration_seconds=config["tts_seconds"], latency_seconds=config["tts_latency"])
+    apply_shake_effect = config["shake"]
+    profile = get_profile(config.get("profile", FALLBACK_PROFILE))
+
+    sampler = ResourceSampler().start()
+    try:
+        with JOB_QUEUE.job(story_job_id(json_story_path)) as workspace:
+            start_time = time.time()
+            scheduler, builder, cleanup = stitch.start_story_render(workspace, apply_shake_effect, tts_backend, profile)
+            builder.cast_ready()
+            for scene in story.scenes:
+                builder.add_scene(scene)
+            builder.close()
+            try:
+                scheduler.run()
+            finally:
+                cleanup()
+            pipeline_seconds = time.time() - start_time
+
+            # A failed line is stitched as silence of a default length, which would time a different video
+            timeline = get_timeline(workspace.assets_dir)
+            failed_lines = [line.audio_name for scene in story.scenes for line in scene.lines
+                            if timeline.duration(line.audio_name) is None]
+            if failed_lines:
+                raise RuntimeError(f"{len(failed_lines)} of {sum(len(scene.lines) for scene in story.scenes)} TTS lines "
+                                   f"failed or are unreadable (first: {failed_lines[0]}), the run is not comparable")
+
+            # Time a full encode: the segments the pipeline journaled would otherwise be reused
+            shutil.rmtree(workspace.segments_dir, ignore_errors=True)
+            os.makedirs(workspace.segments_dir)
+            start_time = time.time()
+            final_video_path = stitch.stitch_assets(story, workspace, apply_shake_effect, profile)
+            stitch_seconds = time.time() - start_time
+    finally:
+        sampler.stop()
+
+    video_seconds = probe_duration(final_video_path) or 0.0
+    metrics = {
+        "pipeline_seconds": pipeline_seconds,
+        "stitch_seconds": stitch_seconds,
+        "stitch_fps": video_seconds * profile.fps / stitch_seconds if stitch_seconds else 0.0,
+        "video_seconds": video_seconds,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "peak_children_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "peak_open_files": sampler.peak_open_files,
+        "peak_child_processes": sampler.peak_child_processes,
+    }
+    for stage, seconds in stage_wall_times(scheduler.spans).items():
+        metrics[f"stage_{stage}_seconds"] = seconds
+    return {name: value for name, value in metrics.items() if value is not None}
+
+
+# Calibration segments from a rendered story: its job workspace's images with the durations
+# recorded at TTS time. Returns None when the story has not been rendered yet.
+def story_segments(json_story_path):
+    from story_model import Story
+    from job_queue import JobWorkspace, story_job_id
+    from timeline import get_timeline
+
+    # The story.json of an app job sits in its workspace; a story file rendered by stitch.py has one of its own
+    story_dir = os.path.dirname(os.path.abspath(json_story_path))
+    if os.path.basename(story_dir) == "output_json":
+        job_root = os.path.dirname(story_dir)
+        workspace = JobWorkspace(os.path.basename(job_root), os.path.dirname(job_root))
+    else:
+        workspace = JobWorkspace(story_job_id(json_story_path))
+    timeline = get_timeline(workspace.assets_dir)
+    segments = []
+    for scene in Story.load(json_story_path).scenes:
+        for line in scene.lines:
+            image_path = os.path.join(workspace.assets_dir, line.image_name)
+            audio_path = os.path.join(workspace.assets_dir, line.audio_name)
+            duration = timeline.duration(line.audio_name)
+            if os.path.exists(image_path) and duration:
+                segments.append((image_path, audio_path, duration))
+    return segments or None
+
+
+# Stand-in stills (gradients under soft shapes, closer to diffusion output than noise) over silence
+def synthetic_segments(work_dir, count=8, size=(768, 768), duration=3.0, seed=0):
+    rng = np.random.default_rng(seed)
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    segments = []
+    for index in range(count):
+        image = np.empty((height, width, 3), dtype=np.float32)
+        for channel in range(3):
+            a, b, c = rng.uniform(-1, 1, size=3)
+            image[:, :, channel] = 128 + 60 * np.sin(a * x / 97 + b * y / 131 + c * 6)
+        for _ in range(12):
+            cx, cy, radius = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(20, 160)
+            mask = np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * radius ** 2))[:, :, None]
+            image = image * (1 - mask) + rng.uniform(0, 255, size=3) * mask
+        image += rng.normal(0, 4, size=image.shape)
+        path = os.path.join(work_dir, f"calibration_{index:02d}.png")
+        Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(path)
+        segments.append((path, None, duration))
+    return segments
+
+
+def extract_frame(video_path, t, size):
+    from still_encoder import ffmpeg_binary
+
+    width, height = size
+    cmd = [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-ss", f"{t:.3f}", "-i", video_path,
+           "-frames:v", "1", "-s", f"{width}x{height}", "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0 or len(result.stdout) != width * height * 3:
+        raise RuntimeError(f"Could not read a frame at {t:.2f}s of {video_path}: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.uint8).reshape(height, width, 3)
+
+
+# PSNR of the luma (BT.601), so the chroma subsampling every yuv420p encode shares does not dominate
+def psnr(reference, frame):
+    weights = np.array([0.299, 0.587, 0.114])
+    mse = np.mean((reference.astype(np.float64) @ weights - frame.astype(np.float64) @ weights) ** 2)
+    return 100.0 if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+# Encode the segments with a profile the way stitch_assets does (still segments, then a stream
+# copy) and measure the time, the size and the mean PSNR of one frame per segment against its image
+def measure_profile(profile, segments, size, work_dir):
+    from still_encoder import encode_still_segments, concat_segments, probe_duration
+
+    segment_dir = os.path.join(work_dir, profile.name)
+    output_path = os.path.join(work_dir, f"{profile.name}.mp4")
+    start_time = time.time()
+    concat_segments(encode_still_segments(segments, segment_dir, size, profile=profile), output_path)
+    seconds = time.time() - start_time
+
+    scores = []
+    position = 0.0
+    for image_path, _, duration in segments:
+        with Image.open(image_path) as image:
+            reference = np.asarray(image.convert("RGB").resize(size))
+        scores.append(psnr(reference, extract_frame(output_path, position + duration / 2, size)))
+        position += duration
+
+    video_seconds = probe_duration(output_path) or position
+    size_mb = os.path.getsize(output_path) / 1024 ** 2
+    return {
+        "encode_seconds": round(seconds, 3),
+        "realtime_factor": round(video_seconds / seconds, 2) if seconds else None,
+        "size_mb": round(size_mb, 3),
+        "mb_per_minute": round(size_mb / video_seconds * 60, 3) if video_seconds else None,
+        "psnr": round(float(np.mean(scores)), 2),
+    }
+
+
+# The fastest profile whose measurements meet the targets, or the best-quality one if none does
+def pick_profile(measurements, min_psnr=DEFAULT_MIN_PSNR, max_mb_per_minute=None):
+    candidates = [name for name, result in measurements.items()
+                  if result["psnr"] >= min_psnr
+                  and (max_mb_per_minute is None or result["mb_per_minute"] <= max_mb_per_minute)]
+    if candidates:
+        return min(candidates, key=lambda name: measurements[name]["encode_seconds"]), True
+    return max(measurements, key=lambda name: measurements[name]["psnr"]), False
+
+
+# Time every encoding profile on a rendered story (or synthetic stills) and store the pick where
+# get_profile() finds it as the default
+def calibrate(json_story_path=None, min_psnr=DEFAULT_MIN_PSNR, max_mb_per_minute=None, output_path=CALIBRATION_PATH,
+              size=(768, 768)):
+    work_dir = tempfile.mkdtemp(prefix="jsonav_calibration_")
+    try:
+        segments = story_segments(json_story_path) if json_story_path else None
+        if segments is None:
+            if json_story_path:
+                print(f"No rendered assets for {json_story_path}; calibrating on synthetic stills instead.", flush=True)
+            segments = synthetic_segments(work_dir, size=size)
+
+        measurements = {}
+        for name, profile in PROFILES.items():
+            print(f"Calibrating {profile.describe()}...", flush=True)
+            measurements[name] = measure_profile(profile, segments, size, work_dir)
+            print(f"  {measurements[name]}", flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    name, meets_targets = pick_profile(measurements, min_psnr, max_mb_per_minute)
+    if not meets_targets:
+        print(f"[ERROR] No profile meets the targets; using {name}, the highest quality one.", flush=True)
+    calibration = {
+        "profile": name,
+        "meets_targets": meets_targets,
+        "targets": {"min_psnr": min_psnr, "max_mb_per_minute": max_mb_per_minute},
+        "story": json_story_path,
+        "segments": len(segments),
+        "machine": {"node": platform.node(), "cpus": os.cpu_count(), "platform": platform.platform()},
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "measurements": measurements,
+    }
+    tmp_path = f"{output_path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(calibration, f, indent=4)
+    os.replace(tmp_path, output_path)
+    return calibration
+
+
+def config_from_args(args):
+    return {
+        "scenes": args.scenes,
+        "actors": args.actors,
+        "actors_per_scene": args.actors_per_scene,
+        "line_words": args.line_words,
+        "seed": args.seed,
+        "tts_seconds": args.tts_seconds,
+        "tts_latency": args.tts_latency,
+        "diffusion_latency": args.diffusion_latency,
+        "shake": args.shake,
+        "profile": args.profile,
+    }
+
+
+def config_key(config):
+    return json.dumps(config, sort_keys=True)
+
+
+# Each repeat runs in a fresh process and work directory, so caches start cold and peak RSS is per run
+def run_repeats(config, repeats, keep_work_dirs=False):
+    runs = []
+    for repeat in range(repeats):
+        work_dir = tempfile.mkdtemp(prefix="jsonav_bench_")
+        cmd = [sys.executable, os.path.abspath(__file__), "_single", json.dumps(config), work_dir]
+        print(f"Benchmark run {repeat + 1}/{repeats} in {work_dir}...", flush=True)
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        lines = [line for line in result.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+        if result.returncode != 0 or not lines:
+            print(result.stdout[-4000:], flush=True)
+            raise RuntimeError(f"Benchmark run {repeat + 1} failed with exit code {result.returncode}")
+        runs.append(json.loads(lines[-1][len(RESULT_PREFIX):]))
+        if not keep_work_dirs:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Median of every metric over the repeats
+    names = sorted({name for run in runs for name in run})
+    return {name: statistics.median([run[name] for run in runs if name in run]) for name in names}
+
+
+# Metrics that got worse than the baseline by more than threshold, as (name, baseline, current)
+def find_regressions(baseline, current, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for name, base_value in baseline.items():
+        if name not in current or name in INFORMATIONAL or not base_value:
+            continue
+        value = current[name]
+        if name in HIGHER_IS_BETTER:
+            worse = value < base_value * (1 - threshold)
+        else:
+            worse = value > base_value * (1 + threshold)
+        if worse:
+            regressions.append((name, base_value, value))
+    return regressions
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_baseline(path, config, metrics):
+    baselines = load_baselines(path)
+    baselines[config_key(config)] = {"config": config, "metrics": metrics, "saved": time.strftime('%Y-%m-%d %H:%M:%S')}
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(baselines, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def print_report(metrics, baseline=None):
+    print(f"{'metric':<28}{'current':>12}{'baseline':>12}{'change':>10}", flush=True)
+    for name, value in sorted(metrics.items()):
+        base_value = (baseline or {}).get(name)
+        if base_value:
+            change = f"{(value - base_value) / base_value * 100:+.1f}%"
+            print(f"{name:<28}{value:>12.2f}{base_value:>12.2f}{change:>10}", flush=True)
+        else:
+            print(f"{name:<28}{value:>12.2f}{'-':>12}{'-':>10}", flush=True)
+
+
+def add_story_arguments(parser):
+    parser.add_argument("--scenes", type=int, default=10)
+    parser.add_argument("--actors", type=int, default=3)
+    parser.add_argument("--actors-per-scene", type=int, default=2)
+    parser.add_argument("--line-words", type=int, default=20, help="Words per narration, dialogue and description")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "_single":
+        # Internal: one measured run, started by run_repeats in a fresh process
+        metrics = single_run(json.loads(argv[1]), argv[2])
+        print(RESULT_PREFIX + json.dumps(metrics), flush=True)
+        return 0
+
+    parser = argparse.ArgumentParser(description="Offline JSONAV pipeline benchmark with stand-in TTS and diffusion.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    story_parser = commands.add_parser("story", help="Write a synthetic story.json")
+    story_parser.add_argument("output")
+    add_story_arguments(story_parser)
+
+    run_parser = commands.add_parser("run", help="Run the benchmark and compare it against the stored baseline")
+    add_story_arguments(run_parser)
+    run_parser.add_argument("--tts-seconds", type=float, default=2.0, help="Length of every stand-in TTS line")
+    run_parser.add_argument("--tts-latency", type=float, default=0.05, help="Seconds the stand-in TTS waits per line")
+    run_parser.add_argument("--diffusion-latency", type=float, default=0.2, help="Seconds the stand-in diffusion waits per image")
+    run_parser.add_argument("--shake", action="store_true", help="Render with the shake effect")
+    run_parser.add_argument("--profile", choices=list(PROFILES), default=FALLBACK_PROFILE, help="Encoding profile")
+    run_parser.add_argument("--repeat", type=int, default=1, help="Runs to take the median of")
+    run_parser.add_argument("--baseline", default=BASELINE_PATH)
+    run_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Allowed slowdown before a metric is flagged (0.2 = 20%%)")
+    run_parser.add_argument("--save-baseline", action="store_true", help="Store this result as the baseline for its settings")
+    run_parser.add_argument("--keep", action="store_true", help="Keep the work directories of the runs")
+    calibrate_parser = commands.add_parser("calibrate", help="Time every encoding profile and store the fastest one that meets the targets")
+    calibrate_parser.add_argument("--story", default=None, help="A story.json rendered before, whose images are the sample (default: synthetic stills)")
+    calibrate_parser.add_argument("--min-psnr", type=float, default=DEFAULT_MIN_PSNR, help="Lowest acceptable mean PSNR in dB")
+    calibrate_parser.add_argument("--max-mb-per-minute", type=float, default=None, help="Largest acceptable file size per minute of video")
+    calibrate_parser.add_argument("--output", default=CALIBRATION_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "calibrate":
+        calibration = calibrate(args.story, args.min_psnr, args.max_mb_per_minute, args.output)
+        print(f"Selected encoding profile '{calibration['profile']}', saved to {args.output}", flush=True)
+        return 0
+
+    if args.command == "story":
+        story = synthetic_story(args.scenes, args.actors, args.actors_per_scene, args.line_words, args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(story, f, indent=4)
+        print(f"Synthetic story with {args.scenes} scenes written to {args.output}", flush=True)
+        return 0
+
+    config = config_from_args(args)
+    metrics = run_repeats(config, max(1, args.repeat), args.keep)
+    baseline = load_baselines(args.baseline).get(config_key(config))
+
+    print_report(metrics, baseline["metrics"] if baseline else None)
+    if args.save_baseline:
+        save_baseline(args.baseline, config, metrics)
+        print(f"Baseline saved to {args.baseline}", flush=True)
+        return 0
+    if baseline is None:
+        print(f"No baseline for these settings in {args.baseline}; run with --save-baseline to store one.", flush=True)
+        return 0
+
+    regressions = find_regressions(baseline["metrics"], metrics, args.threshold)
+    for name, base_value, value in regressions:
+        print(f"[REGRESSION] {name}: {value:.2f} vs baseline {base_value:.2f}", flush=True)
+    if regressions:
+        return 1
+    print("No regressions beyond the threshold.", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
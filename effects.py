@@ -0,0 +1,46 @@
+import zlib
+
+import cv2
+import numpy as np
+
+SHAKE_ZOOM_FACTOR = 1.15  # Zoom in so the shaken frame never shows the image edges
+SHAKE_DECAY = 0.995
+
+
+# Offsets (x, y) for every frame of a decaying random-walk shake, one row per frame.
+# Seeded, so the same clip always shakes the same way whatever order frames are requested in.
+def shake_trajectory(duration, fps=24, intensity=5, seed=0):
+    n_frames = max(1, int(np.ceil(duration * fps)))
+    rng = np.random.default_rng(seed)
+    decay = intensity * SHAKE_DECAY ** np.arange(n_frames)
+    steps = rng.uniform(-0.5, 0.5, size=(n_frames, 2)) * decay[:, None]
+    return np.cumsum(steps, axis=0)
+
+
+# Apply the shake effect to a still image clip. The image is zoomed once and every frame is an
+# integer crop of that buffer at the precomputed offset for time t.
+def apply_screen_shake(clip, fps=24, intensity=5, seed=None):
+    source = clip.get_frame(0)
+    height, width = source.shape[:2]
+    zoomed = cv2.resize(source, (0, 0), fx=SHAKE_ZOOM_FACTOR, fy=SHAKE_ZOOM_FACTOR)
+    margin_x = (zoomed.shape[1] - width) // 2
+    margin_y = (zoomed.shape[0] - height) // 2
+
+    if seed is None:
+        seed = zlib.crc32(np.ascontiguousarray(source[::16, ::16]).tobytes())
+    trajectory = shake_trajectory(clip.duration, fps, intensity, seed)
+
+    # Keep the crop window inside the zoomed image, then turn offsets into crop origins
+    offsets = np.rint(trajectory).astype(np.int64)
+    offsets[:, 0] = np.clip(offsets[:, 0], -margin_x, margin_x)
+    offsets[:, 1] = np.clip(offsets[:, 1], -margin_y, margin_y)
+    origins_x = margin_x - offsets[:, 0]
+    origins_y = margin_y - offsets[:, 1]
+    last_frame = len(offsets) - 1
+
+    def shake_frame(t):
+        index = min(max(int(t * fps), 0), last_frame)
+        x, y = origins_x[index], origins_y[index]
+        return zoomed[y:y + height, x:x + width]
+
+    return clip.fl(lambda get_frame, t: shake_frame(t))
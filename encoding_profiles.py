@@ -0,0 +1,70 @@
+import os
+import json
+
+# Named x264/AAC settings for every encode. Stories are slideshows, so a low frame rate loses
+# nothing for stills and only makes the shake effect coarser.
+# `python benchmark.py calibrate` picks the fastest one that meets a quality target on this machine.
+
+# The profile used when none is chosen: JSONAV_ENCODING_PROFILE, else the calibrated one, else balanced
+ENCODING_PROFILE = os.environ.get("JSONAV_ENCODING_PROFILE")
+CALIBRATION_PATH = os.environ.get("JSONAV_ENCODING_CALIBRATION", "encoding_calibration.json")
+FALLBACK_PROFILE = "balanced"
+
+
+class EncodingProfile:
+    __slots__ = ("name", "preset", "crf", "threads", "fps", "audio_bitrate")
+
+    # threads=0 lets the encoder pick; worker pools then give each encoder its share of the cores
+    def __init__(self, name, preset, crf, threads=0, fps=24, audio_bitrate="128k"):
+        self.name = name
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
+        self.fps = fps
+        self.audio_bitrate = audio_bitrate
+
+    def video_args(self, threads=None):
+        threads = self.threads if threads is None else threads
+        return ["-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf), "-threads", str(threads)]
+
+    def audio_args(self):
+        return ["-c:a", "aac", "-b:a", self.audio_bitrate]
+
+    def describe(self):
+        return (f"{self.name}: preset {self.preset}, crf {self.crf}, {self.fps} fps, audio {self.audio_bitrate}, "
+                f"threads {self.threads or 'auto'}")
+
+
+PROFILES = {
+    "draft": EncodingProfile("draft", "ultrafast", 30, fps=12, audio_bitrate="96k"),
+    "balanced": EncodingProfile("balanced", "veryfast", 23, fps=24, audio_bitrate="128k"),
+    "archival": EncodingProfile("archival", "slow", 18, fps=24, audio_bitrate="192k"),
+}
+
+
+def calibrated_profile_name(path=CALIBRATION_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            name = json.load(f).get("profile")
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Could not read encoding calibration {path}: {e}", flush=True)
+        return None
+    return name if name in PROFILES else None
+
+
+def default_profile_name():
+    if ENCODING_PROFILE in PROFILES:
+        return ENCODING_PROFILE
+    return calibrated_profile_name() or FALLBACK_PROFILE
+
+
+# A profile by name (or the profile itself); None gives the default profile
+def get_profile(profile=None):
+    if isinstance(profile, EncodingProfile):
+        return profile
+    name = profile or default_profile_name()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown encoding profile '{name}', expected one of {sorted(PROFILES)}")
+    return PROFILES[name]
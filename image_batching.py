@@ -0,0 +1,138 @@
+import os
+import time
+
+import numpy as np
+
+from image_cache import IMAGE_CACHE, image_cache_key
+from asset_manifest import get_asset_manifest, place_asset, write_atomically
+from model_registry import DEFAULT_MODEL_ID
+from tracing import DETACHED_TRACER, METRICS
+
+# Upper bound on prompts per diffusion forward pass
+IMAGE_BATCH_SIZE = int(os.environ.get("JSONAV_IMAGE_BATCH_SIZE", "4"))
+
+# Rough activation memory needed per image at 768x768 in fp16, scaled by resolution
+IMAGE_MEMORY_PER_SAMPLE_GB = 1.5
+REFERENCE_PIXELS = 768 * 768
+
+# Fixed generation settings so identical prompts give identical (and cacheable) images
+IMAGE_SEED = int(os.environ.get("JSONAV_IMAGE_SEED", "42"))
+IMAGE_STEPS = int(os.environ.get("JSONAV_IMAGE_STEPS", "50"))
+IMAGE_HEIGHT = 768
+IMAGE_WIDTH = 768
+
+
+# Optional import of torch: stand-in pipelines (see benchmark.py) run without it
+def import_torch():
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+
+# Pick a batch size that fits into the accelerator memory that is currently free
+def estimate_batch_size(max_batch_size=IMAGE_BATCH_SIZE, height=IMAGE_HEIGHT, width=IMAGE_WIDTH):
+    torch = import_torch()
+    if torch is None or not torch.cuda.is_available():
+        return max(1, max_batch_size)
+    free_bytes, _ = torch.cuda.mem_get_info()
+    per_sample = IMAGE_MEMORY_PER_SAMPLE_GB * 1024 ** 3 * (height * width) / REFERENCE_PIXELS
+    fits = int(free_bytes * 0.8 // per_sample)
+    return max(1, min(max_batch_size, fits))
+
+
+# Write a generated image under each of its names in organized_dir, add it to the cache and record it
+# in the manifest. Files appear complete or not at all, and are only recorded once they are there.
+def persist_image(image, key, image_names, organized_dir, manifest, cache):
+    organized_path = os.path.join(organized_dir, image_names[0])
+    write_atomically(organized_path, lambda tmp_path: image.save(tmp_path, format="PNG"))
+    if cache is not None:
+        cache.store(key, organized_path)
+    for image_name in image_names[1:]:
+        place_asset(organized_path, os.path.join(organized_dir, image_name))
+    for image_name in image_names:
+        manifest.record(image_name, key)
+
+
+# Run all jobs through the pipeline in batches and write each image under its expected name.
+# Images whose prompt and model settings are unchanged since the last run are kept as they are, and
+# images already in the cache, or repeated within this run, are copied instead of generated.
+# With an asset store, generated images are handed to a streaming encoder in this process as RGB
+# arrays and their PNGs are written by its background writers, so the next batch starts without
+# waiting for the encode; with store=None they are written before the next batch. Every diffusion
+# call is a span of `tracer`. Without torch, only a stand-in pipeline can run: it gets no seeded
+# generators and there is no out-of-memory retry.
+def generate_images_batched(pipe, accelerator, jobs, organized_dir, batch_size=None,
+                            model_id=DEFAULT_MODEL_ID, cache=IMAGE_CACHE, store=None, tracer=None):
+    torch = import_torch()
+    out_of_memory = torch.cuda.OutOfMemoryError if torch is not None else ()
+
+    tracer = tracer or DETACHED_TRACER
+    os.makedirs(organized_dir, exist_ok=True)
+    manifest = get_asset_manifest(organized_dir)
+
+    # Group file names by cache key so every unique prompt is rendered at most once
+    pending = {}
+    for image_name, prompt in jobs:
+        key = image_cache_key(model_id, prompt, IMAGE_SEED, IMAGE_STEPS, IMAGE_HEIGHT, IMAGE_WIDTH)
+        if manifest.is_current(image_name, key):
+            print(f"Image {image_name} is up to date")
+            METRICS.increment("jsonav_images_total", source="current")
+            continue
+        manifest.forget(image_name)
+        if key in pending:
+            pending[key][1].append(image_name)
+        elif cache is not None and cache.fetch(key, os.path.join(organized_dir, image_name)):
+            manifest.record(image_name, key)
+            METRICS.increment("jsonav_images_total", source="cache")
+            print(f"Image {image_name} served from cache")
+        else:
+            pending[key] = (prompt, [image_name])
+
+    work = [(key, prompt, image_names) for key, (prompt, image_names) in pending.items()]
+
+    batch_size = batch_size or estimate_batch_size()
+    print(f"Generating {len(work)} unique images for {len(jobs)} assets in batches of up to {batch_size}...", flush=True)
+
+    index = 0
+    while index < len(work):
+        batch = work[index:index + batch_size]
+        prompts = [prompt for _, prompt, _ in batch]
+        generators = None
+        if torch is not None:
+            generators = [torch.Generator(device=accelerator.device).manual_seed(IMAGE_SEED) for _ in batch]
+        start_time = time.time()
+        try:
+            with tracer.span("diffusion", "gpu", images=len(batch), files=[names[0] for _, _, names in batch]):
+                with accelerator.autocast():
+                    images = pipe(prompts, num_inference_steps=IMAGE_STEPS, height=IMAGE_HEIGHT,
+                                  width=IMAGE_WIDTH, generator=generators).images
+        except out_of_memory:
+            if batch_size == 1:
+                raise
+            # Back off and retry the same prompts with a smaller batch
+            batch_size = max(1, batch_size // 2)
+            torch.cuda.empty_cache()
+            print(f"[ERROR] Out of memory, reducing image batch size to {batch_size}", flush=True)
+            continue
+
+        for (key, _, image_names), image in zip(batch, images):
+            if store is None:
+                persist_image(image, key, image_names, organized_dir, manifest, cache)
+            else:
+                rgb = np.asarray(image.convert("RGB"))
+                paths = [os.path.join(organized_dir, image_name) for image_name in image_names]
+                for path in paths:
+                    store.put(path, rgb)
+                store.persist(paths, lambda image=image, key=key, image_names=image_names:
+                              persist_image(image, key, image_names, organized_dir, manifest, cache))
+            METRICS.increment("jsonav_images_total", len(image_names), source="generated")
+            print(f"Image generated as {', '.join(image_names)}")
+
+        print(f"Generated batch of {len(batch)} images in {time.time() - start_time:.2f} seconds.", flush=True)
+        index += len(batch)
+
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Image cache: {stats['hits']} hits, {stats['misses']} misses", flush=True)
@@ -0,0 +1,103 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+from asset_manifest import place_asset
+
+# On-disk cache of generated images, shared by every run in this working directory
+IMAGE_CACHE_DIR = os.environ.get("JSONAV_IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_GB = float(os.environ.get("JSONAV_IMAGE_CACHE_GB", "5"))
+
+# Share of the budget eviction frees the cache down to, so a full cache is not scanned on every store
+IMAGE_CACHE_LOW_WATER = 0.9
+
+
+# Content address for an image: everything that influences the diffusion output
+def image_cache_key(model_id, prompt, seed, steps, height, width):
+    payload = json.dumps([model_id, prompt, seed, steps, height, width], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR, max_gb=IMAGE_CACHE_MAX_GB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_gb * 1024 ** 3)
+        self.hits = 0
+        self.misses = 0
+        self._bytes = None  # size of the cached images, from the last scan plus what was stored since
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    # Copy a cached image to dest_path (atomically), returns False on a miss
+    def fetch(self, key, dest_path):
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                return False
+            self.hits += 1
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path)
+        place_asset(path, dest_path)
+        return True
+
+    def store(self, key, src_path):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(src_path, tmp_path)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            if self._bytes is not None:
+                self._bytes += size - replaced
+            over_budget = self._bytes is None or self._bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if not file_name.endswith(".png"):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    # Drop least recently used images until the cache fits its size budget, freeing it down to the low
+    # water mark once it is over. This stats every cached image, so store() only calls it when the size
+    # tracked in memory is over the budget or not known yet.
+    def evict(self):
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * IMAGE_CACHE_LOW_WATER if total > self.max_bytes else self.max_bytes
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            self._bytes = total
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+IMAGE_CACHE = ImageCache()
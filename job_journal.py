@@ -0,0 +1,114 @@
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from asset_manifest import JsonStore
+
+JOURNAL_FILE_NAME = "journal.json"
+
+# Job states in the journal; a job killed while running keeps "running", so it shows as interrupted
+STATUS_RUNNING = "running"
+STATUS_FAILED = "failed"
+STATUS_COMPLETED = "completed"
+
+
+# What a job was started with and which of its stages are done, saved atomically with every change.
+# The finer units are journaled next to their files: every line and image in the asset manifest of
+# organized_assets, every encoded scene segment in the manifest of the segments folder. A job that
+# fails or is killed is resumed by running it again in the same workspace: finished units are reused
+# and only the missing ones are produced.
+class JobJournal(JsonStore):
+    unreadable = "The job will start over."
+
+    def __init__(self, job_root):
+        super().__init__(os.path.join(job_root, JOURNAL_FILE_NAME))
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self.entries.get(key, default)
+
+    # Mark the job running, recording (or replacing) the settings it runs with
+    def start(self, **settings):
+        with self._lock:
+            self.entries.update(settings)
+            self.entries.setdefault("stages", {})
+            self.entries.setdefault("started", datetime.now().isoformat(timespec='seconds'))
+            self.entries["status"] = STATUS_RUNNING
+            self.entries.pop("error", None)
+            self._touch()
+
+    # Record a finished stage and what it produced (a file path, or True)
+    def complete(self, stage, result=True):
+        with self._lock:
+            self.entries.setdefault("stages", {})[stage] = result
+            self._touch()
+
+    def stage(self, stage):
+        with self._lock:
+            return self.entries.get("stages", {}).get(stage)
+
+    def finish(self, error=None):
+        with self._lock:
+            if error is None:
+                self.entries["status"] = STATUS_COMPLETED
+            else:
+                self.entries["status"] = STATUS_FAILED
+                self.entries["error"] = f"{type(error).__name__}: {error}"
+            self._touch()
+
+    # Run the job body between start() and finish(); an exception marks the job failed and is re-raised
+    @contextmanager
+    def running(self, **settings):
+        self.start(**settings)
+        try:
+            yield self
+        except Exception as e:
+            self.finish(e)
+            raise
+        self.finish()
+
+    def _touch(self):
+        self.entries["updated"] = datetime.now().isoformat(timespec='seconds')
+        self._save()
+
+
+# Journals of the jobs under root that did not complete, oldest first
+def interrupted_jobs(root):
+    if not os.path.isdir(root):
+        return []
+    journals = []
+    for job_id in sorted(os.listdir(root)):
+        journal = JobJournal(os.path.join(root, job_id))
+        if journal.get("status") in (STATUS_RUNNING, STATUS_FAILED):
+            journals.append((job_id, journal))
+    return sorted(journals, key=lambda item: item[1].get("updated", ""))
+
+
+# List the jobs that can be resumed:  python job_journal.py [jobs_dir]
+def main(argv=None):
+    from job_queue import JOBS_DIR
+
+    argv = sys.argv[1:] if argv is None else argv
+    root = argv[0] if argv else JOBS_DIR
+    jobs = interrupted_jobs(root)
+    if not jobs:
+        print(f"No interrupted jobs in {root}", flush=True)
+        return 0
+    for job_id, journal in jobs:
+        stages = ", ".join(journal.get("stages", {})) or "none"
+        print(f"{job_id}  {journal.get('status')}  updated {journal.get('updated')}  stages done: {stages}", flush=True)
+        if journal.get("error"):
+            print(f"    error: {journal.get('error')}", flush=True)
+        if journal.get("kind") == "story":
+            print(f"    resume: render {journal.get('story_path')} again with stitch.py or batch_render.py", flush=True)
+        else:
+            print(f"    resume: enter {job_id} under 'Resume job' in the app", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
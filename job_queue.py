@@ -0,0 +1,107 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from parallel_render import RENDER_WORKERS
+from tracing import Tracer, METRICS, TRACE_FILE_NAME
+from job_journal import JobJournal
+
+# Every job renders into its own workspace under this directory
+JOBS_DIR = os.environ.get("JSONAV_JOBS_DIR", "jobs")
+
+# Admission limits: pipelines running at once, jobs on the accelerator at once, and encodes at once
+MAX_ACTIVE_JOBS = int(os.environ.get("JSONAV_MAX_JOBS", "4"))
+DIFFUSION_SLOTS = int(os.environ.get("JSONAV_DIFFUSION_SLOTS", "1"))
+ENCODE_SLOTS = int(os.environ.get("JSONAV_ENCODE_SLOTS", str(max(1, RENDER_WORKERS))))
+
+
+def new_job_id():
+    return f"job_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{uuid.uuid4().hex[:8]}"
+
+
+# Renders of the same story file share a workspace, so edits are re-rendered incrementally
+def story_job_id(json_story_path):
+    return f"story_{hashlib.sha256(os.path.abspath(json_story_path).encode('utf-8')).hexdigest()[:12]}"
+
+
+# The directories of one job: the same layout the scripts used to share at the top level, plus
+# the encoded scene segments, the tracer its stages record spans with and the journal it resumes from
+class JobWorkspace:
+    def __init__(self, job_id, root=JOBS_DIR):
+        self.job_id = job_id
+        self.root = os.path.join(root, job_id)
+        self.tracer = Tracer(job_id)
+        self.json_dir = os.path.join(self.root, "output_json")
+        self.tts_dir = os.path.join(self.root, "tts_output")
+        self.assets_dir = os.path.join(self.root, "organized_assets")
+        self.final_dir = os.path.join(self.root, "final_output")
+        self.segments_dir = os.path.join(self.root, "segments")
+        self.journal = JobJournal(self.root)
+
+    @property
+    def directories(self):
+        return [self.json_dir, self.tts_dir, self.assets_dir, self.final_dir, self.segments_dir]
+
+    def create(self):
+        for directory in self.directories:
+            os.makedirs(directory, exist_ok=True)
+        return self
+
+
+# Admits whole jobs up to max_jobs and hands out process-wide diffusion and encode slots, so
+# concurrent users share the accelerator and the encoder cores instead of oversubscribing them
+class JobQueue:
+    def __init__(self, max_jobs=MAX_ACTIVE_JOBS, diffusion_slots=DIFFUSION_SLOTS, encode_slots=ENCODE_SLOTS, root=JOBS_DIR):
+        self.root = root
+        self._jobs = threading.BoundedSemaphore(max(1, max_jobs))
+        self._diffusion = threading.BoundedSemaphore(max(1, diffusion_slots))
+        self._encode = threading.BoundedSemaphore(max(1, encode_slots))
+        self._workspace_locks = {}
+        self._lock = threading.Lock()
+
+    def _workspace_lock(self, job_id):
+        with self._lock:
+            return self._workspace_locks.setdefault(job_id, threading.Lock())
+
+    @contextmanager
+    def _slot(self, semaphore, label):
+        start_time = time.time()
+        semaphore.acquire()
+        waited = time.time() - start_time
+        METRICS.observe("jsonav_slot_wait_seconds", waited, slot=label)
+        if waited > 0.1:
+            print(f"Waited {waited:.2f} seconds for a {label} slot", flush=True)
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    # Run a job in its workspace; a new one unless job_id names an existing workspace, in which
+    # case jobs on that workspace run one after another. The job's spans are written to trace.json
+    # in the workspace when it ends.
+    @contextmanager
+    def job(self, job_id=None):
+        workspace = JobWorkspace(job_id or new_job_id(), self.root)
+        with self._workspace_lock(workspace.job_id):
+            with self._slot(self._jobs, "job"):
+                print(f"Job {workspace.job_id} started in {workspace.root}", flush=True)
+                workspace.create()
+                try:
+                    with workspace.tracer.span("job", "job", job_id=workspace.job_id):
+                        yield workspace
+                finally:
+                    trace_path = workspace.tracer.write(os.path.join(workspace.root, TRACE_FILE_NAME))
+                    print(f"Trace of job {workspace.job_id} written to {trace_path}", flush=True)
+
+    def diffusion_slot(self):
+        return self._slot(self._diffusion, "diffusion")
+
+    def encode_slot(self):
+        return self._slot(self._encode, "encode")
+
+
+JOB_QUEUE = JobQueue()
@@ -0,0 +1,104 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from story_stream import IncrementalStoryParser, stream_story
+
+# Address of the local AI server (LM Studio)
+LLM_SERVER_URL = os.environ.get("JSONAV_LLM_URL", "http://localhost:1234/v1/chat/completions")
+
+# Connect and read timeouts; local models can take minutes to write a long story
+LLM_CONNECT_TIMEOUT = 10
+LLM_READ_TIMEOUT = float(os.environ.get("JSONAV_LLM_TIMEOUT", "600"))
+
+# How many stories are requested at once, and how often a malformed answer is retried
+LLM_CONCURRENCY = int(os.environ.get("JSONAV_LLM_CONCURRENCY", "2"))
+LLM_RETRIES = int(os.environ.get("JSONAV_LLM_RETRIES", "2"))
+
+
+# Pull the story JSON out of a completion, ignoring fences or chatter around the object
+def parse_story_text(text):
+    parser = IncrementalStoryParser()
+    parser.feed(text)
+    return parser.result()
+
+
+# Reusable client for the local completion server: pooled keep-alive connections, timeouts,
+# transport retries, and retry of completions that do not contain valid story JSON
+class LLMClient:
+    def __init__(self, url=LLM_SERVER_URL, retries=LLM_RETRIES, concurrency=LLM_CONCURRENCY,
+                 timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT), backoff=1.0):
+        self.url = url
+        self.retries = retries
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.backoff = backoff
+        self.session = requests.Session()
+        transport_retry = Retry(total=retries, connect=retries, backoff_factor=backoff,
+                                status_forcelist=[502, 503, 504], allowed_methods=None)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(4, self.concurrency), max_retries=transport_retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def complete(self, payload):
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    def _retry_delay(self, attempt, error):
+        delay = self.backoff * (2 ** attempt)
+        print(f"[ERROR] Story attempt {attempt + 1} failed: {error}. Retrying in {delay:.1f}s", flush=True)
+        time.sleep(delay)
+
+    # One complete story as a dict, asking again when the model answers with malformed JSON
+    def generate_story(self, payload):
+        for attempt in range(self.retries + 1):
+            try:
+                return parse_story_text(self.complete(payload))
+            except ValueError as e:
+                if attempt == self.retries:
+                    raise
+                self._retry_delay(attempt, e)
+
+    # Streamed story with incremental hand-off. A malformed stream is only retried while nothing
+    # has been handed off yet, so callers never see the same scene twice.
+    def stream_story(self, payload, on_actors=None, on_scene=None):
+        handed_off = []
+
+        def track(callback):
+            def wrapper(value):
+                handed_off.append(value)
+                if callback is not None:
+                    callback(value)
+            return wrapper
+
+        for attempt in range(self.retries + 1):
+            try:
+                return stream_story(self.url, payload, on_actors=track(on_actors), on_scene=track(on_scene),
+                                    timeout=self.timeout, session=self.session)
+            except ValueError as e:
+                if attempt == self.retries or handed_off:
+                    raise
+                self._retry_delay(attempt, e)
+
+    # Generate a batch of stories with up to `concurrency` requests in flight. Returns one entry per
+    # payload, in order: the story dict, or the exception that made it fail.
+    def generate_stories(self, payloads, concurrency=None):
+        def run(payload):
+            try:
+                return self.generate_story(payload)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency or self.concurrency), thread_name_prefix="llm") as executor:
+            return list(executor.map(run, payloads))
+
+    def close(self):
+        self.session.close()
+
+
+LLM_CLIENT = LLMClient()
@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# Default Stable Diffusion checkpoint used by the image generation step
+DEFAULT_MODEL_ID = "stabilityai/stable-diffusion-2-1"
+
+# Checkpoints to pre-warm when the app starts (comma separated list in JSONAV_MODELS)
+CONFIGURED_MODEL_IDS = [m.strip() for m in os.environ.get("JSONAV_MODELS", DEFAULT_MODEL_ID).split(",") if m.strip()]
+
+# Memory budget for resident pipelines, least recently used models are evicted above it
+MODEL_MEMORY_BUDGET_GB = float(os.environ.get("JSONAV_MODEL_MEMORY_GB", "10"))
+
+
+# Measure how many bytes of weights a loaded pipeline holds
+def pipeline_size_bytes(pipe):
+    import torch
+
+    total = 0
+    for component in pipe.components.values():
+        if isinstance(component, torch.nn.Module):
+            for tensor in list(component.parameters()) + list(component.buffers()):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+# Process-wide registry that loads each pipeline once and serves it to every request.
+# torch, accelerate and diffusers are only imported once a model or the accelerator is needed.
+class ModelRegistry:
+    def __init__(self, memory_budget_gb=MODEL_MEMORY_BUDGET_GB):
+        self.memory_budget_bytes = int(memory_budget_gb * 1024 ** 3)
+        self._accelerator = None
+        self._pipelines = OrderedDict()  # model_id -> (pipeline, size in bytes), oldest first
+        self._known_sizes = {}
+        self._lock = threading.RLock()
+
+    @property
+    def accelerator(self):
+        with self._lock:
+            if self._accelerator is None:
+                from accelerate import Accelerator
+                self._accelerator = Accelerator()
+            return self._accelerator
+
+    def loaded_models(self):
+        with self._lock:
+            return list(self._pipelines.keys())
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(size for _, size in self._pipelines.values())
+
+    # Serve an already constructed pipeline under model_id, e.g. a stand-in for offline benchmarks
+    def register(self, model_id, pipe, size=0):
+        with self._lock:
+            self._pipelines[model_id] = (pipe, size)
+            self._pipelines.move_to_end(model_id)
+
+    # Serve an already constructed accelerator, e.g. a stand-in, so accelerate is never imported
+    def register_accelerator(self, accelerator):
+        with self._lock:
+            self._accelerator = accelerator
+
+    def get(self, model_id=DEFAULT_MODEL_ID):
+        with self._lock:
+            if model_id in self._pipelines:
+                self._pipelines.move_to_end(model_id)
+                return self._pipelines[model_id][0]
+
+            # Make room up front if we already know how large this model is
+            self._evict(self._known_sizes.get(model_id, 0))
+
+            print(f"Loading diffusion model {model_id}...", flush=True)
+            start_time = time.time()
+            import torch
+            from diffusers import StableDiffusionPipeline
+            pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=torch.float16)
+            pipe = pipe.to(self.accelerator.device)
+            size = pipeline_size_bytes(pipe)
+            self._known_sizes[model_id] = size
+            self._pipelines[model_id] = (pipe, size)
+            print(f"Loaded {model_id} ({size / 1024 ** 3:.2f} GB) in {time.time() - start_time:.2f} seconds.", flush=True)
+
+            # The model we just loaded always stays, older ones go if we are over budget
+            self._evict(0, keep=model_id)
+            return pipe
+
+    def evict(self, model_id):
+        with self._lock:
+            entry = self._pipelines.pop(model_id, None)
+            if entry is None:
+                return False
+            print(f"Evicting diffusion model {model_id} from memory", flush=True)
+            del entry
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            return True
+
+    def _evict(self, incoming_bytes, keep=None):
+        while self._pipelines:
+            if self.resident_bytes() + incoming_bytes <= self.memory_budget_bytes:
+                break
+            candidates = [m for m in self._pipelines if m != keep]
+            if not candidates:
+                break
+            self.evict(candidates[0])
+
+    def warm_up(self, model_ids=None):
+        for model_id in model_ids or CONFIGURED_MODEL_IDS:
+            try:
+                self.get(model_id)
+            except Exception as e:
+                print(f"[ERROR] Failed to warm up model {model_id}: {e}", flush=True)
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+def get_pipeline(model_id=DEFAULT_MODEL_ID):
+    return MODEL_REGISTRY.get(model_id)
+
+
+def get_accelerator():
+    return MODEL_REGISTRY.accelerator
+
+
+# Load configured models in the background so the UI comes up immediately
+def warm_up_models(model_ids=None, background=True):
+    if not background:
+        MODEL_REGISTRY.warm_up(model_ids)
+        return None
+    thread = threading.Thread(target=MODEL_REGISTRY.warm_up, args=(model_ids,), daemon=True, name="model-warmup")
+    thread.start()
+    return thread
@@ -0,0 +1,111 @@
+import struct
+
+# Duration of an MP3 from its frame headers alone, without starting a decoder. Uses the
+# Xing/Info or VBRI frame count when the encoder wrote one, otherwise walks every frame header.
+# Returns None when the headers do not add up, so callers can fall back to a real decoder.
+
+# Bitrates in kbit/s by [MPEG-1?][layer][index]
+BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# Sample rates by version bits: 0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1
+SAMPLE_RATES = {0: [11025, 12000, 8000], 2: [22050, 24000, 16000], 3: [44100, 48000, 32000]}
+
+# How far into the file (after any ID3v2 tag) the first frame may start
+MAX_LEADING_GARBAGE = 4096
+
+
+# (frame length, samples per frame, sample rate) of the frame header at offset, or None
+def parse_frame_header(data, offset):
+    if offset + 4 > len(data):
+        return None
+    header = struct.unpack(">I", data[offset:offset + 4])[0]
+    if header >> 21 != 0x7FF:
+        return None
+    version = (header >> 19) & 3
+    layer = 4 - ((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 0xF
+    sample_rate_index = (header >> 10) & 3
+    padding = (header >> 9) & 1
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    samples = 1152 if layer == 2 or mpeg1 else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples, sample_rate
+
+
+# Skip an ID3v2 tag at the start of the file
+def audio_start(data):
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+# Frame count from a Xing/Info or VBRI header in the first frame, or None
+def vbr_frame_count(data, offset):
+    header = struct.unpack(">I", data[offset:offset + 4])[0]
+    mpeg1 = (header >> 19) & 3 == 3
+    mono = (header >> 6) & 3 == 3
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = offset + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if flags & 1:
+            return struct.unpack(">I", data[xing + 8:xing + 12])[0]
+    vbri = offset + 36
+    if data[vbri:vbri + 4] == b"VBRI":
+        return struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+    return None
+
+
+def mp3_header_duration(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    # Find the first frame that is followed by another valid frame
+    offset = audio_start(data)
+    limit = min(len(data), offset + MAX_LEADING_GARBAGE)
+    while offset < limit:
+        frame = parse_frame_header(data, offset)
+        if frame and frame[0] > 0 and parse_frame_header(data, offset + frame[0]):
+            break
+        offset += 1
+    else:
+        return None
+
+    frame_count = vbr_frame_count(data, offset)
+    if frame_count:
+        _, samples, sample_rate = parse_frame_header(data, offset)
+        return frame_count * samples / sample_rate
+
+    total_seconds = 0.0
+    while offset < len(data):
+        frame = parse_frame_header(data, offset)
+        if frame is None or frame[0] <= 0:
+            # Only trailing tags may follow the last frame; anything else means damaged headers
+            if data[offset:offset + 3] == b"TAG" or data[offset:offset + 8] == b"APETAGEX":
+                break
+            return None
+        length, samples, sample_rate = frame
+        if offset + length > len(data):
+            # A truncated last frame still holds some audio, but not a reliable amount
+            return None
+        total_seconds += samples / sample_rate
+        offset += length
+    return total_seconds if total_seconds > 0 else None
@@ -0,0 +1,106 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from audio_assembler import write_soundtrack
+from encoding_profiles import get_profile
+
+# Worker processes for per-scene rendering; 1 keeps the single moviepy encode of the whole story
+RENDER_WORKERS = int(os.environ.get("JSONAV_RENDER_WORKERS", str(os.cpu_count() or 1)))
+
+# Workers start from a fresh interpreter, never as a fork of this process: writer, GPU and TTS threads
+# run here, and a forked worker could inherit a lock or a pending write that nothing ever releases
+RENDER_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+# Encoder threads for each of `workers` encodes running at once, so together they fill the cores once
+def threads_per_encoder(workers=RENDER_WORKERS):
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+# Build a silent moviepy clip from (image_path, audio_path, duration) segments. With an asset store,
+# images generated in this process come from it as RGB arrays; the others are read from their files.
+# Worker processes pass no store and only read files.
+# moviepy (and OpenCV for the shake) are imported on first use, so spawning a worker stays cheap.
+def build_segments_video(segments, apply_shake_effect, store=None):
+    from moviepy.editor import ImageClip, concatenate_videoclips
+    from effects import apply_screen_shake
+
+    clips = []
+    for image_path, _, duration in segments:
+        # Create the image clip with the same duration as its audio
+        frame = store.get(image_path) if store is not None else None
+        if frame is None:
+            frame = store.wait(image_path) if store is not None else image_path
+        image_clip = ImageClip(frame).set_duration(duration)
+
+        # Apply shake effect to the image clip if enabled
+        if apply_shake_effect:
+            print("Applying shake effect to clip...")
+            image_clip = apply_screen_shake(image_clip, intensity=5)  # Set shake intensity here
+
+        clips.append(image_clip)
+
+    return concatenate_videoclips(clips) if len(clips) > 1 else clips[0]
+
+
+# Give a video the soundtrack of its segments, assembled into one WAV: a single audio reader
+# for the whole clip instead of one per line, with silence generated in memory
+def with_soundtrack(video_clip, segments, soundtrack_path):
+    from moviepy.editor import AudioFileClip
+
+    write_soundtrack(segments, soundtrack_path)
+    return video_clip.set_audio(AudioFileClip(soundtrack_path))
+
+
+# Build a moviepy clip with sound from segments; audio_path None means silence
+def build_segments_clip(segments, apply_shake_effect, soundtrack_path):
+    return with_soundtrack(build_segments_video(segments, apply_shake_effect), segments, soundtrack_path)
+
+
+# Close a clip and its audio reader
+def close_clip(clip):
+    clip.close()
+    if clip.audio is not None:
+        clip.audio.close()
+
+
+# Worker entry point: render one scene to its own file with an encoding profile. Runs in a separate
+# process, so it only takes plain data and closes every reader it opened before returning.
+def render_scene_segment(segments, output_path, apply_shake_effect, profile=None, threads=1):
+    profile = get_profile(profile)
+    soundtrack_path = f"{os.path.splitext(output_path)[0]}_soundtrack.wav"
+    clip = build_segments_clip(segments, apply_shake_effect, soundtrack_path)
+    try:
+        clip.write_videofile(output_path, fps=profile.fps, codec="libx264", preset=profile.preset,
+                             ffmpeg_params=["-crf", str(profile.crf)], audio_codec="aac",
+                             audio_bitrate=profile.audio_bitrate, threads=profile.threads or threads, logger=None)
+    finally:
+        close_clip(clip)
+        os.remove(soundtrack_path)
+    return output_path
+
+
+# Process pool that renders whole scenes on every core; each encoder gets its share of threads
+class SceneRenderPool:
+    def __init__(self, workers=RENDER_WORKERS):
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_encoder(self.workers)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context(RENDER_START_METHOD))
+
+    def submit(self, segments, output_path, apply_shake_effect, profile=None):
+        return self._executor.submit(render_scene_segment, segments, output_path, apply_shake_effect,
+                                     get_profile(profile), self.threads_per_worker)
+
+    def render(self, segments, output_path, apply_shake_effect, profile=None):
+        return self.submit(segments, output_path, apply_shake_effect, profile).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
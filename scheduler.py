@@ -0,0 +1,174 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Worker threads per resource: the story stream, network-bound TTS, the accelerator,
+# and CPU work such as clip assembly
+DEFAULT_POOL_SIZES = {
+    "llm": 1,
+    "tts": int(os.environ.get("JSONAV_TTS_WORKERS", "2")),
+    "gpu": 1,
+    "cpu": max(1, min(4, os.cpu_count() or 1)),
+}
+
+
+# Runs named tasks as soon as their dependencies finish, each on the worker pool of its resource.
+# A task is called with the results of its dependencies, in the order they were declared.
+# Running tasks may add more tasks, which is how scenes are handed off while a story streams in.
+class StageScheduler:
+    def __init__(self, pool_sizes=None):
+        self.pool_sizes = dict(DEFAULT_POOL_SIZES, **(pool_sizes or {}))
+        self.tasks = {}  # name -> (fn, deps, pool), in insertion order
+        self.timings = {}
+        self.spans = {}  # name -> (start, end) wall-clock times
+        self._lock = threading.RLock()
+        self._executors = None
+        self._results = {}
+        self._waiting = {}
+        self._running = {}
+
+    def add(self, name, fn, deps=(), pool="cpu"):
+        with self._lock:
+            if name in self.tasks:
+                raise ValueError(f"Task {name} is already scheduled")
+            missing = [dep for dep in deps if dep not in self.tasks]
+            if missing:
+                # Dependencies must be added first, which also rules out cycles
+                raise ValueError(f"Task {name} depends on unknown tasks {missing}")
+            if pool not in self.pool_sizes:
+                raise ValueError(f"Unknown worker pool '{pool}' for task {name}")
+            self.tasks[name] = (fn, list(deps), pool)
+            self._waiting[name] = {dep for dep in deps if dep not in self._results}
+            if self._executors is not None:
+                self._submit_ready()
+
+    def _run_task(self, name, fn, args):
+        start_time = time.time()
+        try:
+            return fn(*args)
+        finally:
+            end_time = time.time()
+            self.timings[name] = end_time - start_time
+            self.spans[name] = (start_time, end_time)
+            print(f"Task {name} finished in {self.timings[name]:.2f} seconds on {threading.current_thread().name}", flush=True)
+
+    def _submit_ready(self):
+        for name in [n for n, deps in self._waiting.items() if not deps]:
+            del self._waiting[name]
+            fn, deps, pool = self.tasks[name]
+            future = self._executors[pool].submit(self._run_task, name, fn, [self._results[dep] for dep in deps])
+            self._running[future] = name
+
+    def run(self):
+        with self._lock:
+            self._executors = {pool: ThreadPoolExecutor(max_workers=size, thread_name_prefix=pool)
+                               for pool, size in self.pool_sizes.items()}
+            self._submit_ready()
+
+        try:
+            while True:
+                with self._lock:
+                    futures = list(self._running)
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                with self._lock:
+                    for future in done:
+                        name = self._running.pop(future)
+                        # Re-raise the first failure; nothing that depends on it can run
+                        self._results[name] = future.result()
+                        for deps in self._waiting.values():
+                            deps.discard(name)
+                    self._submit_ready()
+        finally:
+            with self._lock:
+                for future in self._running:
+                    future.cancel()
+                executors = self._executors
+                self._executors = None
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        if self._waiting:
+            raise RuntimeError(f"Tasks never became ready: {sorted(self._waiting)}")
+        return dict(self._results)
+
+
+# Adds the per-scene task graph to a scheduler, one scene at a time: TTS and image groups run
+# concurrently, each scene is assembled once its own narration, dialogue and images exist, and
+# close() adds a "final" task that receives every scene result in story order.
+# Consecutive scenes are grouped so the diffusion model still sees batches of image_batch_size images.
+# Voices and portraits both come from the cast, so neither TTS nor images of a scene start before
+# cast_ready() (or close()) says the actors are known.
+class StoryScheduleBuilder:
+    def __init__(self, scheduler, synthesize_scene, render_scene_group, assemble_scene, finish, image_batch_size=1):
+        self.scheduler = scheduler
+        self.synthesize_scene = synthesize_scene
+        self.render_scene_group = render_scene_group
+        self.assemble_scene = assemble_scene
+        self.finish = finish
+        self.image_batch_size = max(1, image_batch_size)
+        self.cast_known = False
+        self.scene_tasks = []
+        self._held_tts = []  # (tts task, scene) waiting for the cast
+        self._pending = []  # (scene index, scene, tts task) waiting for their image group
+        self._pending_images = 0
+        self._group_count = 0
+        self._lock = threading.Lock()
+
+    # The scenes' lines are linked to the cast: start the TTS and image groups held back until now
+    def cast_ready(self):
+        with self._lock:
+            self._release_cast()
+            if self._pending_images >= self.image_batch_size:
+                self._flush_group()
+
+    def add_scene(self, scene):
+        with self._lock:
+            scene_index = len(self.scene_tasks) + len(self._pending)
+            tts_task = f"tts:{scene_index}"
+            if self.cast_known:
+                self._add_tts(tts_task, scene)
+            else:
+                self._held_tts.append((tts_task, scene))
+            self._pending.append((scene_index, scene, tts_task))
+            self._pending_images += len(scene.lines)
+            if self.cast_known and self._pending_images >= self.image_batch_size:
+                self._flush_group()
+
+    def close(self):
+        with self._lock:
+            self._release_cast()
+            if self._pending:
+                self._flush_group()
+            self.scheduler.add("final", self.finish, deps=list(self.scene_tasks), pool="cpu")
+
+    def _add_tts(self, tts_task, scene):
+        self.scheduler.add(tts_task, lambda: self.synthesize_scene(scene), pool="tts")
+
+    def _release_cast(self):
+        self.cast_known = True
+        for tts_task, scene in self._held_tts:
+            self._add_tts(tts_task, scene)
+        self._held_tts = []
+
+    def _flush_group(self):
+        group = [scene for _, scene, _ in self._pending]
+        image_task = f"images:{self._group_count}"
+        self._group_count += 1
+        self.scheduler.add(image_task, lambda: self.render_scene_group(group), pool="gpu")
+
+        for scene_index, scene, tts_task in self._pending:
+            scene_task = f"scene:{scene_index}"
+            self.scheduler.add(scene_task, lambda *_, scene=scene: self.assemble_scene(scene),
+                               deps=[tts_task, image_task], pool="cpu")
+            self.scene_tasks.append(scene_task)
+        self._pending = []
+        self._pending_images = 0
+
+
+def create_story_schedule(synthesize_scene, render_scene_group, assemble_scene, finish, image_batch_size=1, pool_sizes=None):
+    scheduler = StageScheduler(pool_sizes)
+    builder = StoryScheduleBuilder(scheduler, synthesize_scene, render_scene_group, assemble_scene, finish, image_batch_size)
+    return scheduler, builder
@@ -0,0 +1,88 @@
+import os
+import subprocess
+from functools import lru_cache
+
+from mp3_probe import mp3_header_duration
+from encoding_profiles import get_profile
+
+
+# Same ffmpeg binary moviepy uses, looked up on first use so importing this module stays cheap
+@lru_cache(maxsize=None)
+def ffmpeg_binary():
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+AUDIO_SAMPLE_RATE = 44100
+
+
+# Duration of an audio file in seconds, or None if ffmpeg cannot read it. MP3s are measured from
+# their frame headers; ffmpeg is only started when the headers are damaged.
+def probe_duration(path):
+    if path.lower().endswith(".mp3"):
+        duration = mp3_header_duration(path)
+        if duration is not None:
+            return duration
+    try:
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+        duration = ffmpeg_parse_infos(path).get('duration')
+    except Exception:
+        return None
+    return duration if duration else None
+
+
+def run_ffmpeg(args):
+    cmd = [ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error"] + args
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.decode(errors='replace').strip()}")
+
+
+# Encode one still image with its audio (or silence) for exactly `duration` seconds with an encoding
+# profile. The image is looped by ffmpeg itself, so no frames are produced or piped from Python.
+# threads is this encode's share of the cores when several run at once; the profile's own setting wins.
+def encode_still_segment(image_path, audio_path, duration, output_path, size, profile=None, threads=0):
+    profile = get_profile(profile)
+    width, height = size
+    args = ["-loop", "1", "-framerate", str(profile.fps), "-i", image_path]
+    if audio_path:
+        args += ["-i", audio_path]
+    else:
+        args += ["-f", "lavfi", "-i", f"anullsrc=r={AUDIO_SAMPLE_RATE}:cl=stereo"]
+    args += [
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-t", f"{duration:.3f}",
+        "-vf", f"scale={width}:{height},format=yuv420p",
+        *profile.video_args(profile.threads or threads), "-tune", "stillimage", "-r", str(profile.fps),
+        "-af", "apad",
+        *profile.audio_args(), "-ar", str(AUDIO_SAMPLE_RATE), "-ac", "2",
+        output_path,
+    ]
+    run_ffmpeg(args)
+    return output_path
+
+
+# Encode (image_path, audio_path or None, duration) segments into segment_dir, returns the files in order
+def encode_still_segments(segments, segment_dir, size, prefix="segment", profile=None):
+    os.makedirs(segment_dir, exist_ok=True)
+    segment_files = []
+    for index, (image_path, audio_path, duration) in enumerate(segments):
+        output_path = os.path.join(segment_dir, f"{prefix}_{index:03d}.mp4")
+        encode_still_segment(image_path, audio_path, duration, output_path, size, profile)
+        segment_files.append(output_path)
+    return segment_files
+
+
+# Join encoded segments with the concat demuxer; streams are copied, not re-encoded
+def concat_segments(segment_files, output_path):
+    if not segment_files:
+        raise ValueError("No video segments to concatenate")
+    list_path = f"{output_path}.segments.txt"
+    with open(list_path, 'w') as f:
+        for segment_file in segment_files:
+            escaped = os.path.abspath(segment_file).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", "-movflags", "+faststart", output_path])
+    finally:
+        os.remove(list_path)
+    return output_path
@@ -1,358 +1,330 @@
 import os
-import json
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
-import edge_tts
-from transformers import pipeline
-from diffusers import StableDiffusionPipeline
-from moviepy.editor import ImageClip, concatenate_videoclips, AudioFileClip
-import time
 from datetime import datetime
-import torch
-import numpy as np
-import gradio as gr
-import cv2
-from accelerate import Accelerator
-from pydub import AudioSegment
-
-# Directories
-TTS_OUTPUT_DIR = "tts_output"
-IMAGES_OUTPUT_DIR = "output_images"
-ORGANIZED_ASSETS_DIR = "organized_assets"
-FINAL_VIDEO_DIR = "final_output"
-SAVED_PROJECTS_DIR = "saved_projects"
-SILENT_MP3_PATH = "path_to_silence.mp3"
-
-# Ensure the saved projects directory exists
-if not os.path.exists(SAVED_PROJECTS_DIR):
-    os.makedirs(SAVED_PROJECTS_DIR)
-
-# Custom Screen Shake Effect Class and Function
-class Screen:
-    def __init__(self):
-        self.x = 0
-        self.y = 0
-        self.shaking = False
-        self.shake_duration = 0
-        self.shake_intensity = 0
-        self.shake_counter = 0
-
-    def shake(self, duration, intensity):
-        self.shaking = True
-        self.shake_duration = duration
-        self.shake_intensity = intensity
-        self.shake_counter = 0
-
-    def update_shake(self, delta_time):
-        if not self.shaking:
-            return
-
-        if self.shake_counter >= self.shake_duration:
-            self.shaking = False
-            self.shake_intensity = 0
-            self.shake_counter = 0
-            self.shake_duration = 0
-            self.x = 0
-            self.y = 0
-            return
-
-        shake_x = (np.random.uniform(-0.5, 0.5)) * self.shake_intensity
-        shake_y = (np.random.uniform(-0.5, 0.5)) * self.shake_intensity
-
-        self.x += shake_x
-        self.y += shake_y
-
-        self.shake_intensity *= 0.995
-
-        self.shake_counter += delta_time
-
-# Apply the shake effect to the scene or actor images
-def apply_screen_shake(clip, screen, fps=24, intensity=5):
-    duration = clip.duration
-    screen.shake(duration=duration, intensity=intensity)
-    
-    def shake_frame(get_frame, t):
-        frame = get_frame(t)
-        screen.update_shake(1/fps)
-        height, width, _ = frame.shape
-        
-        zoom_factor = 1.15  # Increased zoom to prevent edge visibility
-        zoomed_frame = cv2.resize(frame, (0, 0), fx=zoom_factor, fy=zoom_factor)
-
-        translation_matrix = np.float32([[1, 0, screen.x], [0, 1, screen.y]])
-        shaken_frame = cv2.warpAffine(zoomed_frame, translation_matrix, (width, height))
-        
-        return shaken_frame
-    
-    return clip.fl(shake_frame)
-
-# Function to create silent MP3 if it doesn't exist
-def create_silent_audio_if_not_exists(duration_ms=5000, path=SILENT_MP3_PATH):
-    if not os.path.exists(path):
-        print(f"Silent MP3 does not exist, creating {path}...", flush=True)
-        silence = AudioSegment.silent(duration=duration_ms)
-        silence.export(path, format="mp3")
-        print(f"Silent MP3 created at {path}", flush=True)
-    else:
-        print(f"Silent MP3 already exists at {path}", flush=True)
-
-create_silent_audio_if_not_exists()
+from model_registry import get_pipeline, get_accelerator, warm_up_models
+from image_batching import generate_images_batched, IMAGE_BATCH_SIZE, IMAGE_WIDTH, IMAGE_HEIGHT
+from tts_backends import synthesize_lines
+from scheduler import create_story_schedule
+from asset_manifest import get_asset_manifest, asset_input_hash
+from parallel_render import SceneRenderPool, RENDER_WORKERS, threads_per_encoder
+from stream_writer import write_streaming_video, STREAM_RENDER
+from encoding_profiles import PROFILES, get_profile, default_profile_name
+from still_encoder import encode_still_segment, concat_segments
+from timeline import get_timeline
+from story_model import Story
+from job_queue import JOB_QUEUE, MAX_ACTIVE_JOBS, story_job_id
+from asset_store import ASSET_STORE
+from archive_store import ARCHIVE_STORE
+from tracing import start_metrics_server
+
+# Each run works in its own job workspace (see job_queue.py) and is archived to the shared store (see archive_store.py)
 
 # Archive the project files after video creation
-def archive_project(json_story_path):
+def archive_project(json_story_path, workspace, final_video_path):
     print("Archiving project files...", flush=True)
+    ASSET_STORE.flush(workspace.assets_dir)
     timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    project_folder = os.path.join(SAVED_PROJECTS_DIR, f"project_{timestamp}")
-    
-    os.makedirs(project_folder, exist_ok=True)
-    
-    # Create subdirectories for assets and final output
-    assets_dir = os.path.join(project_folder, "assets")
-    final_video_dir = os.path.join(project_folder, "final_video")
-    os.makedirs(assets_dir, exist_ok=True)
-    os.makedirs(final_video_dir, exist_ok=True)
-    
-    # Copy story JSON
-    shutil.copy(json_story_path, project_folder)
-    
-    # Copy assets (images, audio)
-    for file_name in os.listdir(ORGANIZED_ASSETS_DIR):
-        shutil.copy(os.path.join(ORGANIZED_ASSETS_DIR, file_name), assets_dir)
-    
-    # Copy final video(s)
-    for file_name in os.listdir(FINAL_VIDEO_DIR):
-        shutil.copy(os.path.join(FINAL_VIDEO_DIR, file_name), final_video_dir)
-    
-    print(f"Project archived in {project_folder}", flush=True)
 
-# Generate TTS and image prompts
-async def generate_tts_and_prompts(json_story_path):
-    print("Starting TTS and image prompt generation...", flush=True)
-    start_time = time.time()
-
-    with open(json_story_path, 'r') as f:
-        story = json.load(f)
-
-    # Define TTS voices
-    voice_type_male = "en-US-GuyNeural"
-    voice_type_female = "en-US-AriaNeural"
-    voice_type_narration = "en-US-JennyNeural"
-
-    text_prompts = []
-
-    # TTS generation for narration and actor dialogues
-    for scene in story['scenes']:
-        scene_number = scene['scene_number']
-
-        # Generate narration TTS
-        print(f"Generating narration TTS for scene {scene_number}...", flush=True)
-        narration_audio_path = f"{TTS_OUTPUT_DIR}/scene_{scene_number:02d}_narration.mp3"
-        narration_tts = edge_tts.Communicate(scene['narration'], voice_type_narration)
-        await narration_tts.save(narration_audio_path)
-
-        # Move narration TTS to organized_assets
-        organized_narration_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_narration.mp3"
-        shutil.move(narration_audio_path, organized_narration_path)
-
-        # Generate actor dialogues and prepare prompts for images
-        for actor in scene['actors_in_scene']:
-            actor_name = actor['name'].replace(" ", "_").lower()
-            print(f"Generating TTS for actor {actor_name} in scene {scene_number}...", flush=True)
-
-            actor_voice = voice_type_male if actor.get('voice_type', 'Male') == "Male" else voice_type_female
-            actor_audio_path = f"{TTS_OUTPUT_DIR}/scene_{scene_number:02d}_{actor_name}.mp3"
-            dialogue_tts = edge_tts.Communicate(actor['dialogue'], actor_voice)
-            await dialogue_tts.save(actor_audio_path)
-
-            # Move actor dialogue TTS to organized_assets
-            organized_dialogue_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_{actor_name}.mp3"
-            shutil.move(actor_audio_path, organized_dialogue_path)
-
-            # Prepare actor portrait description
-            actor_description = next((a['description'] for a in story['actors'] if a['name'] == actor['name']), "")
-            text_prompts.append(f"Portrait of {actor['name']}, {actor_description}")
-
-        # Prepare scene description for image generation
-        text_prompts.append(scene['description'])
-
-    print(f"TTS and image prompt generation completed in {time.time() - start_time:.2f} seconds.", flush=True)
-    return text_prompts
-
-# Generate images using Stable Diffusion
-def generate_and_organize_images(json_story_path):
-    print("Starting image generation and organization based on story.json...", flush=True)
-    start_time = time.time()
-
-    # Load the Stable Diffusion model
-    accelerator = Accelerator()
-    pipe = StableDiffusionPipeline.from_pretrained("stabilityai/stable-diffusion-2-1", torch_dtype=torch.float16)
-    pipe = pipe.to(accelerator.device)
-
-    # Load the story JSON to access scene numbers and prompts
-    with open(json_story_path, 'r') as f:
-        story = json.load(f)
-
-    # Iterate through scenes to generate images
-    for scene in story['scenes']:
-        scene_number = scene['scene_number']
-
-        # Generate the scene description image
-        scene_description = scene['description']
-        scene_image_name = f"scene_{scene_number:02d}_description.png"
-        print(f"Generating scene image for scene {scene_number}: {scene_description}")
-        
-        with accelerator.autocast():
-            scene_image = pipe(scene_description).images[0]
-        
-        scene_image_path = f"{IMAGES_OUTPUT_DIR}/{scene_image_name}"
-        scene_image.save(scene_image_path)
-        shutil.move(scene_image_path, f"{ORGANIZED_ASSETS_DIR}/{scene_image_name}")
-        print(f"Scene image saved as {scene_image_name}")
-
-        # Generate actor portrait images
-        for actor in scene['actors_in_scene']:
-            actor_name = actor['name'].replace(" ", "_").lower()
-            actor_description = next((a['description'] for a in story['actors'] if a['name'] == actor['name']), None)
-
-            if actor_description:
-                actor_portrait_prompt = f"Portrait of {actor['name']}, {actor_description}"
-                actor_image_name = f"scene_{scene_number:02d}_{actor_name}_portrait.png"
-                print(f"Generating actor portrait for {actor['name']}: {actor_description}")
-
-                with accelerator.autocast():
-                    actor_image = pipe(actor_portrait_prompt).images[0]
-
-                actor_image_path = f"{IMAGES_OUTPUT_DIR}/{actor_image_name}"
-                actor_image.save(actor_image_path)
-                shutil.move(actor_image_path, f"{ORGANIZED_ASSETS_DIR}/{actor_image_name}")
-                print(f"Actor portrait saved as {actor_image_name}")
-
-    print(f"Image generation and organization completed in {time.time() - start_time:.2f} seconds.", flush=True)
+    # Story JSON, assets (images, audio) and this run's final video; files identical to ones
+    # archived before are linked to the same stored blob instead of being copied again
+    files = {os.path.basename(json_story_path): json_story_path}
+    for file_name in os.listdir(workspace.assets_dir):
+        files[os.path.join("assets", file_name)] = os.path.join(workspace.assets_dir, file_name)
+    files[os.path.join("final_video", os.path.basename(final_video_path))] = final_video_path
 
-# Stitch the assets
-def stitch_assets(json_story_path, apply_shake_effect=False):
-    print("Starting video stitching...", flush=True)
-    start_time = time.time()
+    project_folder = ARCHIVE_STORE.archive(f"project_{timestamp}_{workspace.job_id}", files)
+    print(f"Project archived in {project_folder}", flush=True)
 
-    with open(json_story_path, 'r') as file:
-        story = json.load(file)
+# Synthesize the TTS lines of a single scene; with keep_pcm their PCM is handed to the encoder in memory
+def generate_scene_tts(scene, workspace, tts_backend=None, keep_pcm=False):
+    print(f"Generating TTS for scene {scene.number}...", flush=True)
+    asyncio.run(synthesize_lines(scene.tts_lines(), workspace.tts_dir, workspace.assets_dir, backend=tts_backend,
+                                 tracer=workspace.tracer, store=ASSET_STORE if keep_pcm else None))
+
+# Generate the scene and portrait images for a group of scenes in one batch, waiting for the
+# accelerator while other jobs hold the diffusion slots; with keep_images they are handed to the encoder in memory
+def generate_scene_images(scenes, workspace, keep_images=False):
+    accelerator = get_accelerator()
+    pipe = get_pipeline()
+    image_jobs = [job for scene in scenes for job in scene.image_jobs()]
+    with JOB_QUEUE.diffusion_slot():
+        generate_images_batched(pipe, accelerator, image_jobs, workspace.assets_dir, tracer=workspace.tracer,
+                                store=ASSET_STORE if keep_images else None)
+
+# Plan a scene as (image_path, audio_path, duration) segments: narration over the scene image, then
+# each actor's dialogue over their portrait. Missing or unreadable audio becomes silence (audio_path None).
+def scene_segments(scene, workspace):
+    scene_number = scene.number
+    print(f"Stitching scene {scene_number}...", flush=True)
+
+    # Durations come from the timeline recorded at TTS time, so no audio is opened here
+    timeline = get_timeline(workspace.assets_dir)
+
+    # Load the scene description image
+    image_path = f"{workspace.assets_dir}/{scene.narration.image_name}"
+    if not ASSET_STORE.exists(image_path):
+        print(f"[ERROR] Scene image not found: {image_path}")
+        return None
+
+    # Use the narration audio to set the scene duration
+    narration_audio_path = f"{workspace.assets_dir}/{scene.narration.audio_name}"
+    scene_duration = timeline.duration(scene.narration.audio_name)
+    if scene_duration is None:
+        # If there's any issue with the narration audio, fallback to silent audio
+        print(f"[ERROR] Narration audio missing or unreadable for scene {scene_number}: {narration_audio_path}. Using silent audio.")
+        narration_audio_path = None
+        scene_duration = 5  # Set a default duration for the scene
+    else:
+        print(f"Setting scene duration to match narration length: {scene_duration} seconds")
 
-    scene_clips = []
+    segments = [(image_path, narration_audio_path, scene_duration)]
 
-    # Iterate through each scene
-    for scene in story['scenes']:
-        scene_number = scene['scene_number']
-        print(f"Stitching scene {scene_number}...", flush=True)
+    # Add each actor's dialogue with their portrait
+    for line in scene.dialogues:
+        actor_name = line.speaker
 
-        # Load the scene description image
-        image_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_description.png"
-        if not os.path.exists(image_path):
-            print(f"[ERROR] Scene image not found: {image_path}")
+        # Load the actor's portrait
+        actor_image_path = f"{workspace.assets_dir}/{line.image_name}"
+        if not ASSET_STORE.exists(actor_image_path):
+            print(f"[ERROR] Actor portrait not found: {actor_image_path}")
             continue
 
-        # Load the narration audio
-        narration_audio_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_narration.mp3"
-        try:
-            if os.path.exists(narration_audio_path):
-                # Try to load the narration audio to get its duration
-                narration_audio_clip = AudioFileClip(narration_audio_path)
-                scene_duration = narration_audio_clip.duration
-                print(f"Setting scene duration to match narration length: {scene_duration} seconds")
-            else:
-                raise FileNotFoundError(f"Narration audio file {narration_audio_path} not found.")
-        except Exception as e:
-            # If there's any issue with the narration audio, fallback to silent audio
-            print(f"[ERROR] Narration audio error for scene {scene_number}: {e}. Using silent audio.")
-            scene_duration = 5  # Set a default duration for the scene
-            narration_audio_clip = AudioFileClip(SILENT_MP3_PATH).set_duration(scene_duration)
-
-        # Create the scene image clip with the same duration as the narration
-        scene_image_clip = ImageClip(image_path).set_duration(scene_duration)
-        scene_image_clip = scene_image_clip.set_audio(narration_audio_clip)
-
-        # Apply shake effect to the scene image clip if enabled
-        if apply_shake_effect:
-            print("Applying shake effect to scene image...")
-            screen = Screen()
-            scene_image_clip = apply_screen_shake(scene_image_clip, screen, intensity=5)
-
-        actor_clips = []
-
-        for actor in scene['actors_in_scene']:
-            actor_name = actor['name'].replace(" ", "_").lower()
-
-            # Load the actor's portrait
-            actor_image_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_{actor_name}_portrait.png"
-            if not os.path.exists(actor_image_path):
-                print(f"[ERROR] Actor portrait not found: {actor_image_path}")
-                continue
-
-            # Load the actor's dialogue audio
-            actor_audio_path = f"{ORGANIZED_ASSETS_DIR}/scene_{scene_number:02d}_{actor_name}.mp3"
-            try:
-                if os.path.exists(actor_audio_path):
-                    actor_audio_clip = AudioFileClip(actor_audio_path)
-                    dialogue_duration = actor_audio_clip.duration
-                    print(f"Setting actor portrait duration to match dialogue length: {dialogue_duration} seconds")
-                else:
-                    raise FileNotFoundError(f"Dialogue audio file {actor_audio_path} not found.")
-            except Exception as e:
-                print(f"[ERROR] Dialogue audio error for {actor_name} in scene {scene_number}: {e}. Using silent audio.")
-                dialogue_duration = 5  # Set a default duration for actor portrait
-                actor_audio_clip = AudioFileClip(SILENT_MP3_PATH).set_duration(dialogue_duration)
-
-            # Create the actor portrait image clip
-            actor_image_clip = ImageClip(actor_image_path).set_duration(dialogue_duration)
-            actor_image_clip = actor_image_clip.set_audio(actor_audio_clip)
-
-            # Apply shake effect to the actor portrait clip if enabled
-            if apply_shake_effect:
-                print("Applying shake effect to actor clip...")
-                screen = Screen()
-                actor_image_clip = apply_screen_shake(actor_image_clip, screen, intensity=5)
-
-            actor_clips.append(actor_image_clip)
-
-        if actor_clips:
-            actor_sequence_clip = concatenate_videoclips(actor_clips)
-            final_scene_clip = concatenate_videoclips([scene_image_clip, actor_sequence_clip])
+        # Use the actor's dialogue audio to set the portrait duration
+        actor_audio_path = f"{workspace.assets_dir}/{line.audio_name}"
+        dialogue_duration = timeline.duration(line.audio_name)
+        if dialogue_duration is None:
+            print(f"[ERROR] Dialogue audio missing or unreadable for {actor_name} in scene {scene_number}: {actor_audio_path}. Using silent audio.")
+            actor_audio_path = None
+            dialogue_duration = 5  # Set a default duration for actor portrait
+        else:
+            print(f"Setting actor portrait duration to match dialogue length: {dialogue_duration} seconds")
+
+        segments.append((actor_image_path, actor_audio_path, dialogue_duration))
+
+    return segments
+
+# Hash of everything an encoded segment file depends on: the recorded inputs of its images and
+# audio, the durations, the frame size, the encoding profile and the shake effect
+def segment_input_hash(segments, workspace, apply_shake_effect, profile):
+    manifest = get_asset_manifest(workspace.assets_dir)
+    sources = [(manifest.input_hash(os.path.basename(image_path)),
+                manifest.input_hash(os.path.basename(audio_path)) if audio_path else None,
+                round(duration, 3))
+               for image_path, audio_path, duration in segments]
+    return asset_input_hash(sources, IMAGE_WIDTH, IMAGE_HEIGHT, profile.describe(), apply_shake_effect)
+
+# Encode one scene into segment files in the job's segments folder: stills go straight through ffmpeg,
+# one file per line, without rendering frames in Python, while a shaken scene is rendered to one file by
+# moviepy in a worker process of render_pool. Every finished file is journaled in the folder's manifest,
+# so a resumed job only encodes what is missing or changed. Encodes of all jobs share the encode slots.
+def encode_scene_segments(scene, workspace, apply_shake_effect=False, render_pool=None, profile=None):
+    segments = scene_segments(scene, workspace)
+    if segments is None:
+        return []
+    # ffmpeg reads the image files, and their manifest entries go into the segment hashes
+    for image_path, _, _ in segments:
+        ASSET_STORE.wait(image_path)
+    profile = get_profile(profile)
+    journal = get_asset_manifest(workspace.segments_dir)
+    if apply_shake_effect:
+        units = [(f"{scene.prefix}.mp4", segments)]
+    else:
+        units = [(f"{scene.prefix}_{index:03d}.mp4", [segment]) for index, segment in enumerate(segments)]
+
+    pending = []
+    for file_name, unit_segments in units:
+        input_hash = segment_input_hash(unit_segments, workspace, apply_shake_effect, profile)
+        if journal.is_current(file_name, input_hash):
+            print(f"Segment {file_name} is up to date", flush=True)
         else:
-            final_scene_clip = scene_image_clip
+            journal.forget(file_name)
+            pending.append((file_name, unit_segments, input_hash))
+
+    if pending:
+        with JOB_QUEUE.encode_slot(), workspace.tracer.span("scene_clip", "cpu", scene=scene.number, shake=apply_shake_effect):
+            for file_name, unit_segments, input_hash in pending:
+                output_path = os.path.join(workspace.segments_dir, file_name)
+                if apply_shake_effect:
+                    render_pool.render(unit_segments, output_path, apply_shake_effect, profile)
+                else:
+                    image_path, audio_path, duration = unit_segments[0]
+                    encode_still_segment(image_path, audio_path, duration, output_path, (IMAGE_WIDTH, IMAGE_HEIGHT), profile,
+                                         threads_per_encoder())
+                journal.record(file_name, input_hash)
+    return [os.path.join(workspace.segments_dir, file_name) for file_name, _ in units]
+
+# Scenes are encoded as separate segments unless the shake effect needs moviepy and only one worker is
+# allowed, or JSONAV_STREAM_RENDER asks for a single streaming encoder
+def use_segment_rendering(apply_shake_effect):
+    return not STREAM_RENDER and (not apply_shake_effect or RENDER_WORKERS > 1)
+
+def new_final_video_path(workspace):
+    return f"{workspace.final_dir}/final_story_video_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.mp4"
+
+# Stream every scene's segments through one encoder; only the segment being encoded is held in
+# memory, so long stories cost no more memory or open files than short ones
+def write_final_video(scenes_segments, workspace, apply_shake_effect=False, profile=None):
+    profile = get_profile(profile)
+    final_video_path = new_final_video_path(workspace)
+    with JOB_QUEUE.encode_slot(), workspace.tracer.span("final_encode", "cpu", mode="stream", scenes=len(scenes_segments),
+                                                        profile=profile.name):
+        write_streaming_video(scenes_segments, final_video_path, (IMAGE_WIDTH, IMAGE_HEIGHT), apply_shake_effect, profile)
+    return final_video_path
+
+# Join the encoded segments into the final video without re-encoding
+def write_final_segment_video(segment_files, workspace):
+    final_video_path = new_final_video_path(workspace)
+    with workspace.tracer.span("final_encode", "cpu", mode="concat", segments=len(segment_files)):
+        concat_segments(segment_files, final_video_path)
+    return final_video_path
 
-        scene_clips.append(final_scene_clip)
+# Stitch the assets
+def stitch_assets(story, workspace, apply_shake_effect=False, profile=None):
+    print("Starting video stitching...", flush=True)
+    profile = get_profile(profile)
+    with workspace.tracer.span("stitch_assets", "cpu", log="Video stitching", profile=profile.name):
+        if use_segment_rendering(apply_shake_effect):
+            # Encode every scene as its own segments across all cores, then join them with a stream copy
+            render_pool = SceneRenderPool() if apply_shake_effect else None
+            try:
+                with ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS)) as executor:
+                    scene_files = executor.map(
+                        lambda scene: encode_scene_segments(scene, workspace, apply_shake_effect, render_pool, profile),
+                        story.scenes)
+                    segment_files = [f for files in scene_files for f in files]
+                final_video_path = write_final_segment_video(segment_files, workspace)
+            finally:
+                if render_pool is not None:
+                    render_pool.close()
+        else:
+            scenes_segments = []
 
-    final_video_path = f"{FINAL_VIDEO_DIR}/final_story_video_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.mp4"
-    final_video = concatenate_videoclips(scene_clips)
-    final_video.write_videofile(final_video_path, fps=24)
+            # Plan each scene; frames are only produced as the encoder reaches them
+            for scene in story.scenes:
+                segments = scene_segments(scene, workspace)
+                if segments is not None:
+                    scenes_segments.append(segments)
 
-    print(f"Video stitching completed in {time.time() - start_time:.2f} seconds.", flush=True)
+            final_video_path = write_final_video(scenes_segments, workspace, apply_shake_effect, profile)
     return final_video_path
 
-# Main pipeline function
-def run_pipeline(json_story_path, apply_shake):
+# Set up a scheduled render: per-scene TTS, image groups and scene assembly run concurrently and the
+# final video is written with the encoding profile once every scene is ready. Returns the scheduler,
+# the builder scenes are added to, and a cleanup function to call after the scheduler has run.
+def start_story_render(workspace, apply_shake_effect=False, tts_backend=None, profile=None):
+    profile = get_profile(profile)
+    render_pool = None
+    streaming = not use_segment_rendering(apply_shake_effect)
+    if not streaming:
+        # Each scene is encoded to its own segments as soon as its assets are ready, then joined
+        render_pool = SceneRenderPool() if apply_shake_effect else None
+        assemble_scene = lambda scene: encode_scene_segments(scene, workspace, apply_shake_effect, render_pool, profile)
+        finish = lambda *scene_files: write_final_segment_video([f for files in scene_files for f in files], workspace)
+    else:
+        # Scenes are only planned as they become ready; the single encoder streams them at the end
+        assemble_scene = lambda scene: scene_segments(scene, workspace)
+        finish = lambda *scenes_segments: write_final_video([segments for segments in scenes_segments if segments is not None],
+                                                            workspace, apply_shake_effect, profile)
+
+    scheduler, builder = create_story_schedule(
+        synthesize_scene=lambda scene: generate_scene_tts(scene, workspace, tts_backend, keep_pcm=streaming),
+        render_scene_group=lambda scenes: generate_scene_images(scenes, workspace, keep_images=streaming),
+        assemble_scene=assemble_scene,
+        finish=finish,
+        image_batch_size=IMAGE_BATCH_SIZE,
+        pool_sizes={"cpu": max(1, RENDER_WORKERS)},
+    )
+
+    # Wait for the files still being written, which the archive and a resumed job need, then drop the
+    # decoded copies of this job's assets
+    def cleanup():
+        if render_pool is not None:
+            render_pool.close()
+        try:
+            ASSET_STORE.flush(workspace.assets_dir)
+        finally:
+            ASSET_STORE.release(workspace.assets_dir)
+
+    return scheduler, builder, cleanup
+
+# Drop assets of scenes or actors that are no longer in the story; unchanged ones are reused
+def prune_stale_assets(story, workspace):
+    expected_assets = story.asset_names()
+    get_asset_manifest(workspace.assets_dir).prune(expected_assets)
+    get_timeline(workspace.assets_dir).prune(expected_assets)
+
+# Overlap TTS, image generation and scene assembly, encoding once every scene is ready
+def render_story_assets(story, workspace, apply_shake_effect=False, tts_backend=None, profile=None):
+    print("Starting scheduled TTS, image generation and stitching...", flush=True)
+    with workspace.tracer.span("render_story", "job", log="Scheduled rendering"):
+        prune_stale_assets(story, workspace)
+
+        scheduler, builder, cleanup = start_story_render(workspace, apply_shake_effect, tts_backend, profile)
+        builder.cast_ready()
+        for scene in story.scenes:
+            builder.add_scene(scene)
+        builder.close()
+        try:
+            results = scheduler.run()
+        finally:
+            cleanup()
+    return results["final"]
+
+# Render a story file and archive the result; renders of the same story file reuse its job workspace,
+# other stories get their own, so rendering a story again resumes where a failed or killed render
+# stopped. Returns the final video path and the workspace, whose tracer holds the timings.
+def render_story_file(json_story_path, apply_shake_effect=False, tts_backend=None, archive=True, profile=None):
+    profile = get_profile(profile)
+    with JOB_QUEUE.job(story_job_id(json_story_path)) as workspace:
+        with workspace.journal.running(kind="story", story_path=os.path.abspath(json_story_path),
+                                       apply_shake=apply_shake_effect, encoding_profile=profile.name) as journal:
+            final_video_path = render_story_assets(Story.load(json_story_path), workspace, apply_shake_effect, tts_backend, profile)
+            journal.complete("final", final_video_path)
+
+            if archive:
+                archive_project(json_story_path, workspace, final_video_path)
+                journal.complete("archive")
+
+    return final_video_path, workspace
+
+# Main pipeline function; encoding_profile names one of PROFILES, None uses the default profile
+def run_pipeline(json_story_path, apply_shake, encoding_profile=None):
     print("Pipeline started.", flush=True)
-    asyncio.run(generate_tts_and_prompts(json_story_path))
-    generate_and_organize_images(json_story_path)
-    final_video_path = stitch_assets(json_story_path, apply_shake.lower() == 'yes')
-    
-    archive_project(json_story_path)
-    
+    final_video_path, _ = render_story_file(json_story_path, apply_shake.lower() == 'yes', profile=encoding_profile)
     return final_video_path
 
 # Gradio Interface
-with gr.Blocks() as demo:
-    gr.Markdown("# 🎬 Story to Video Generator")
-    gr.Markdown("Select an existing `story.json` and generate a video with narration and images.")
-
-    with gr.Row():
-        with gr.Column():
-            json_story_path = gr.Textbox(label="Path to Story JSON", placeholder="Enter the path to your story.json file", lines=1)
-            apply_shake = gr.Radio(choices=["yes", "no"], label="Apply shake effect?", value="no")
-            submit_button = gr.Button("Stitch Video 🎥")
-        with gr.Column():
-            video_output = gr.Video(label="Generated Story Video")
-
-    submit_button.click(fn=run_pipeline, inputs=[json_story_path, apply_shake], outputs=video_output)
-
-# Launch the app
-demo.launch()
+def build_ui():
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.Markdown("# 🎬 Story to Video Generator")
+        gr.Markdown("Select an existing `story.json` and generate a video with narration and images.")
+
+        with gr.Row():
+            with gr.Column():
+                json_story_path = gr.Textbox(label="Path to Story JSON", placeholder="Enter the path to your story.json file", lines=1)
+                apply_shake = gr.Radio(choices=["yes", "no"], label="Apply shake effect?", value="no")
+                encoding_profile = gr.Dropdown(choices=list(PROFILES), label="Encoding profile", value=default_profile_name())
+                submit_button = gr.Button("Stitch Video 🎥")
+            with gr.Column():
+                video_output = gr.Video(label="Generated Story Video")
+
+        submit_button.click(fn=run_pipeline, inputs=[json_story_path, apply_shake, encoding_profile], outputs=video_output)
+
+    return demo
+
+
+# Launch the app, loading the diffusion model(s) in the background meanwhile; up to MAX_ACTIVE_JOBS users are served at once.
+# Importing this module only defines the pipeline stages: no web server, model or heavy library is loaded.
+def main():
+    warm_up_models()
+    start_metrics_server()
+    demo = build_ui()
+    demo.queue(concurrency_count=MAX_ACTIVE_JOBS)
+    demo.launch()
+
+
+if __name__ == "__main__":
+    main()
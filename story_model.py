@@ -0,0 +1,164 @@
+import json
+
+# Define TTS voices
+VOICE_TYPE_MALE = "en-US-GuyNeural"
+VOICE_TYPE_FEMALE = "en-US-AriaNeural"
+VOICE_TYPE_NARRATION = "en-US-JennyNeural"
+
+# Used when a scene's narration, a dialogue or a speaker's name is missing from the JSON
+DEFAULT_NARRATION = ""
+DEFAULT_DIALOGUE = "No dialogue"
+DEFAULT_ACTOR_NAME = "Unknown"
+
+
+# Actor names as they appear in asset file names
+def asset_stem(name):
+    return name.replace(" ", "_").lower()
+
+
+def voice_for(voice_type):
+    return VOICE_TYPE_MALE if voice_type == "Male" else VOICE_TYPE_FEMALE
+
+
+class Actor:
+    __slots__ = ("name", "description", "voice_type")
+
+    def __init__(self, name, description="", voice_type="Male"):
+        self.name = name
+        self.description = description
+        self.voice_type = voice_type
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('name', DEFAULT_ACTOR_NAME), data.get('description') or "", data.get('voice_type', "Male"))
+
+
+# One segment of a scene: a line of speech over an image. The narration is spoken over the scene
+# image, each dialogue over the speaker's portrait. `prompt` is None when the image cannot be
+# generated (an actor without a description), `actor` is None for the narration or an unknown speaker.
+class Line:
+    __slots__ = ("speaker", "text", "voice", "audio_name", "image_name", "prompt", "actor", "voice_type")
+
+    def __init__(self, speaker, text, audio_name, image_name, voice_type=None):
+        self.speaker = speaker
+        self.text = text
+        self.audio_name = audio_name
+        self.image_name = image_name
+        self.voice_type = voice_type  # Set when the scene entry names a voice itself
+        self.voice = VOICE_TYPE_NARRATION
+        self.prompt = None
+        self.actor = None
+
+    # Attach the speaker from the cast index, which decides the voice and the portrait prompt
+    def cast(self, actor):
+        self.actor = actor
+        self.voice = voice_for(self.voice_type or (actor.voice_type if actor else "Male"))
+        self.prompt = f"Portrait of {self.speaker}, {actor.description}" if actor and actor.description else None
+
+
+class Scene:
+    __slots__ = ("number", "description", "lines", "prefix")
+
+    def __init__(self, number, description, narration, dialogues=()):
+        self.number = number
+        self.description = description
+        self.prefix = f"scene_{number:02d}"
+
+        narration_line = Line(None, narration, f"{self.prefix}_narration.mp3", f"{self.prefix}_description.png")
+        narration_line.prompt = description
+        self.lines = [narration_line]
+        spoken = {}
+        for speaker, dialogue, voice_type in dialogues:
+            stem = asset_stem(speaker)
+            # A speaker's second and later lines in the scene get their own audio over the same portrait
+            spoken[stem] = spoken.get(stem, 0) + 1
+            audio_stem = stem if spoken[stem] == 1 else f"{stem}_{spoken[stem]}"
+            self.lines.append(Line(speaker, dialogue, f"{self.prefix}_{audio_stem}.mp3", f"{self.prefix}_{stem}_portrait.png", voice_type))
+
+    @classmethod
+    def from_dict(cls, data):
+        dialogues = [(actor.get('name', DEFAULT_ACTOR_NAME), actor.get('dialogue', DEFAULT_DIALOGUE), actor.get('voice_type'))
+                     for actor in data.get('actors_in_scene', [])]
+        return cls(int(data['scene_number']), data.get('description', ""), data.get('narration', DEFAULT_NARRATION), dialogues)
+
+    @property
+    def narration(self):
+        return self.lines[0]
+
+    @property
+    def dialogues(self):
+        return self.lines[1:]
+
+    # TTS lines as (text, voice, file name)
+    def tts_lines(self):
+        return [(line.text, line.voice, line.audio_name) for line in self.lines]
+
+    # Images as (file name, prompt), the scene image first; a portrait shown for several lines is listed once
+    def image_jobs(self):
+        jobs = {}
+        for line in self.lines:
+            if line.prompt:
+                jobs.setdefault(line.image_name, line.prompt)
+        return list(jobs.items())
+
+
+# The story parsed once per job and shared by every stage: actors indexed by name, scenes with their
+# lines, voices, prompts and asset file names already worked out. Scenes can be added one at a time
+# while a story streams in; actors set later are linked to the lines already there.
+class Story:
+    __slots__ = ("title", "author", "genre", "style", "actors", "scenes", "_actors_by_name")
+
+    def __init__(self, title="", author="", genre="", style=""):
+        self.title = title
+        self.author = author
+        self.genre = genre
+        self.style = style
+        self.actors = []
+        self.scenes = []
+        self._actors_by_name = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        story = cls(data.get('story_title', ""), data.get('author', ""), data.get('genre', ""), data.get('style', ""))
+        story.set_actors(data.get('actors', []))
+        for scene in data['scenes']:
+            story.add_scene(scene)
+        return story
+
+    @classmethod
+    def load(cls, json_story_path):
+        with open(json_story_path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def actor(self, name):
+        return self._actors_by_name.get(name)
+
+    # Set the cast from its JSON entries; returns the Actor records
+    def set_actors(self, actors):
+        self.actors = [actor if isinstance(actor, Actor) else Actor.from_dict(actor) for actor in actors]
+        self._actors_by_name = {}
+        for actor in self.actors:
+            # The first entry wins when two actors share a name, as the old linear scans did
+            self._actors_by_name.setdefault(actor.name, actor)
+        for scene in self.scenes:
+            for line in scene.dialogues:
+                line.cast(self.actor(line.speaker))
+        return self.actors
+
+    # Add a scene from its JSON entry; returns the Scene record
+    def add_scene(self, scene):
+        if not isinstance(scene, Scene):
+            scene = Scene.from_dict(scene)
+        for line in scene.dialogues:
+            line.cast(self.actor(line.speaker))
+        self.scenes.append(scene)
+        return scene
+
+    def image_jobs(self):
+        return [job for scene in self.scenes for job in scene.image_jobs()]
+
+    # Every asset file the story renders to, for pruning what an edit made stale
+    def asset_names(self):
+        return [line.audio_name for scene in self.scenes for line in scene.lines] + \
+               [image_name for image_name, _ in self.image_jobs()]
+
@@ -0,0 +1,112 @@
+import json
+
+import requests
+
+
+# Incremental parser for a story JSON document arriving in pieces. Scenes are emitted as soon as
+# their closing brace arrives, and the actors list as soon as it is complete, long before the
+# whole document is there. Text before the first '{' (```json fences, chatter) is ignored.
+class IncrementalStoryParser:
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.start = None
+        self.end = None
+        self.stack = []  # (opening char, start offset, key of this container in its parent object)
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.pending_key = None
+
+    @property
+    def complete(self):
+        return self.end is not None
+
+    # Feed the next piece of text, returns a list of ("actors", list) and ("scene", dict) events
+    def feed(self, chunk):
+        self.text += chunk
+        events = []
+        text = self.text
+        while self.pos < len(text) and self.end is None:
+            ch = text[self.pos]
+            if self.start is None:
+                if ch == '{':
+                    self.start = self.pos
+                else:
+                    self.pos += 1
+                    continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self.last_string = text[self.string_start + 1:self.pos]
+            elif ch == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif ch == ':':
+                self.pending_key = self.last_string
+            elif ch == ',':
+                self.pending_key = None
+            elif ch in '{[':
+                key = self.pending_key if self.stack and self.stack[-1][0] == '{' else None
+                self.stack.append((ch, self.pos, key))
+                self.pending_key = None
+            elif ch in '}]':
+                opener, start, key = self.stack.pop()
+                depth = len(self.stack)
+                if opener == '{' and depth == 2 and self.stack[1][0] == '[' and self.stack[1][2] == 'scenes':
+                    events.append(("scene", json.loads(text[start:self.pos + 1])))
+                elif opener == '[' and depth == 1 and key == 'actors':
+                    events.append(("actors", json.loads(text[start:self.pos + 1])))
+                elif depth == 0:
+                    self.end = self.pos
+            self.pos += 1
+        return events
+
+    # The full story once the top-level object has closed
+    def result(self):
+        if self.start is None:
+            raise ValueError("No JSON object found in the story response")
+        end = self.end if self.end is not None else len(self.text) - 1
+        return json.loads(self.text[self.start:end + 1])
+
+
+# Yield the content deltas of a streamed OpenAI-style chat completion. Servers that ignore
+# "stream" and answer with a single JSON body are handled too.
+def stream_chat_completion(url, payload, timeout=None, session=None):
+    http = session or requests
+    with http.post(url, json=dict(payload, stream=True), stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if 'text/event-stream' not in response.headers.get('Content-Type', ''):
+            yield response.json()["choices"][0]["message"]["content"]
+            return
+
+        response.encoding = 'utf-8'
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
+
+# Stream a story, calling on_actors(list) and on_scene(dict) as each part completes. Returns the full story.
+def stream_story(url, payload, on_actors=None, on_scene=None, timeout=None, session=None):
+    parser = IncrementalStoryParser()
+    for delta in stream_chat_completion(url, payload, timeout=timeout, session=session):
+        for kind, value in parser.feed(delta):
+            if kind == "actors" and on_actors is not None:
+                on_actors(value)
+            elif kind == "scene" and on_scene is not None:
+                print(f"Scene {value.get('scene_number')} received from the story stream", flush=True)
+                on_scene(value)
+    return parser.result()
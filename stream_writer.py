@@ -0,0 +1,130 @@
+import os
+import tempfile
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+from audio_assembler import segment_frame_count, write_soundtrack
+from parallel_render import build_segments_video
+from asset_store import ASSET_STORE
+from still_encoder import ffmpeg_binary, AUDIO_SAMPLE_RATE
+from encoding_profiles import get_profile
+
+# Render every story through one streaming encoder, even where per-scene segments would be used
+STREAM_RENDER = os.environ.get("JSONAV_STREAM_RENDER", "0") == "1"
+
+
+# One long-lived ffmpeg encode fed a segment at a time: each segment's clip is built, its frames are
+# piped to the encoder and the clip is closed before the next one is opened, so memory and open
+# files stay flat however many scenes the story has. The soundtrack is written to a WAV up front
+# (also one segment at a time) because the encoder reads it alongside the frames. The writer runs in
+# the process that produced the assets, so decoded images and PCM are taken from the asset store.
+class StreamingVideoWriter:
+    def __init__(self, output_path, size, profile=None):
+        self.output_path = output_path
+        self.width, self.height = size
+        self.profile = get_profile(profile)
+        self.fps = self.profile.fps
+        self.soundtrack_path = f"{os.path.splitext(output_path)[0]}_soundtrack.wav"
+        self.frames_written = 0
+        self._audio_frames = 0
+        self._process = None
+        self._stderr = None
+
+    # Write the soundtrack of every (image_path, audio_path, duration) segment and start the encoder
+    def open(self, segments):
+        write_soundtrack(segments, self.soundtrack_path, store=ASSET_STORE)
+        self._stderr = tempfile.TemporaryFile()
+        cmd = [
+            ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{self.width}x{self.height}", "-r", str(self.fps), "-i", "-",
+            "-i", self.soundtrack_path,
+            "-map", "0:v:0", "-map", "1:a:0",
+            *self.profile.video_args(), "-pix_fmt", "yuv420p",
+            *self.profile.audio_args(), "-ar", str(AUDIO_SAMPLE_RATE), "-ac", "2",
+            "-movflags", "+faststart", self.output_path,
+        ]
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr)
+        return self
+
+    def _error(self):
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors='replace').strip()
+
+    def _write(self, data):
+        try:
+            self._process.stdin.write(data)
+        except BrokenPipeError:
+            self._process.wait()
+            raise RuntimeError(f"ffmpeg stopped ({self._process.returncode}): {self._error()}")
+
+    def _frame_bytes(self, frame):
+        if frame.shape[0] != self.height or frame.shape[1] != self.width:
+            frame = np.asarray(Image.fromarray(frame).resize((self.width, self.height)))
+        return np.ascontiguousarray(frame[:, :, :3], dtype=np.uint8).tobytes()
+
+    # Stream one segment. Its frame count follows the soundtrack's sample count, so rounding never
+    # lets the picture drift from the audio over hundreds of segments.
+    def write_segment(self, image_path, duration, apply_shake_effect=False):
+        self._audio_frames += segment_frame_count(duration)
+        end_frame = int(round(self._audio_frames * self.fps / AUDIO_SAMPLE_RATE))
+        frame_count = end_frame - self.frames_written
+        if frame_count <= 0:
+            return
+
+        clip = build_segments_video([(image_path, None, duration)], apply_shake_effect, store=ASSET_STORE)
+        try:
+            if apply_shake_effect:
+                for index in range(frame_count):
+                    self._write(self._frame_bytes(clip.get_frame(min(index / self.fps, clip.duration))))
+            else:
+                # A still gives the same frame every time: convert it once
+                frame = self._frame_bytes(clip.get_frame(0))
+                for _ in range(frame_count):
+                    self._write(frame)
+        finally:
+            clip.close()
+        self.frames_written = end_frame
+
+    def write_segments(self, segments, apply_shake_effect=False):
+        for image_path, _, duration in segments:
+            self.write_segment(image_path, duration, apply_shake_effect)
+
+    # Finish the encode; on failure the encoder is stopped and the partial output removed
+    def close(self, failed=False):
+        try:
+            if self._process is not None:
+                if failed:
+                    self._process.kill()
+                try:
+                    self._process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                if self._process.wait() != 0 and not failed:
+                    failed = True
+                    raise RuntimeError(f"ffmpeg failed ({self._process.returncode}): {self._error()}")
+        finally:
+            self._process = None
+            if self._stderr is not None:
+                self._stderr.close()
+                self._stderr = None
+            if os.path.exists(self.soundtrack_path):
+                os.remove(self.soundtrack_path)
+            if failed and os.path.exists(self.output_path):
+                os.remove(self.output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(failed=exc_type is not None)
+
+
+# Encode a story's (image_path, audio_path, duration) segments scene by scene with a single encoder
+def write_streaming_video(scene_segments, output_path, size, apply_shake_effect=False, profile=None):
+    with StreamingVideoWriter(output_path, size, profile) as writer:
+        writer.open([segment for segments in scene_segments for segment in segments])
+        for segments in scene_segments:
+            writer.write_segments(segments, apply_shake_effect)
+    return output_path
@@ -0,0 +1,76 @@
+import sys
+import json
+import time
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the LM Studio server: answers /v1/chat/completions with a canned story,
+# either as one JSON response or replayed as a token stream, for offline runs and benchmarks.
+
+
+def make_handler(story_text, chunk_size, delay):
+    class StubCompletionHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/v1/chat/completions':
+                self.send_error(404)
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+
+            if not payload.get('stream'):
+                time.sleep(delay * max(1, len(story_text) // chunk_size))
+                body = json.dumps({"choices": [{"message": {"role": "assistant", "content": story_text}}]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            for offset in range(0, len(story_text), chunk_size):
+                chunk = {"choices": [{"index": 0, "delta": {"content": story_text[offset:offset + chunk_size]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return StubCompletionHandler
+
+
+def start_stub_server(story_text, port=1234, chunk_size=16, delay=0.01, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), make_handler(story_text, chunk_size, delay))
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a canned story.json like the local AI server would.")
+    parser.add_argument("story", help="Path to the story JSON to replay")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--chunk-size", type=int, default=16, help="Characters per streamed token")
+    parser.add_argument("--delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    args = parser.parse_args(argv)
+
+    with open(args.story, 'r') as f:
+        story_text = f.read()
+
+    server = start_stub_server(story_text, args.port, args.chunk_size, args.delay)
+    print(f"Stub completion server replaying {args.story} on http://127.0.0.1:{args.port}/v1/chat/completions", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import os
+import threading
+
+from asset_manifest import AssetManifest, get_asset_manifest
+from still_encoder import probe_duration
+
+TIMELINE_FILE_NAME = "timeline.json"
+
+
+# Duration in seconds of every audio file in an asset directory, recorded when the line is
+# synthesized, so the stitcher and the renderers plan scenes without opening the audio again
+class TimelineManifest(AssetManifest):
+    def __init__(self, asset_dir):
+        super().__init__(asset_dir, TIMELINE_FILE_NAME)
+
+    # Duration of an audio asset: the recorded one, else probed once and recorded.
+    # None when the file is missing or unreadable, or when the asset manifest does not record it as a
+    # finished line, so a leftover file from an earlier run is never mistaken for a valid one.
+    def duration(self, file_name):
+        if not os.path.exists(os.path.join(self.asset_dir, file_name)):
+            return None
+        with self._lock:
+            duration = self.entries.get(file_name)
+        if duration is None:
+            if get_asset_manifest(self.asset_dir).input_hash(file_name) is None:
+                return None
+            duration = probe_duration(os.path.join(self.asset_dir, file_name))
+            if duration is not None:
+                self.record(file_name, duration)
+        return duration
+
+    # Only drop entries; the asset manifest owns deleting the files themselves
+    def prune(self, expected_file_names):
+        expected = set(expected_file_names)
+        with self._lock:
+            for file_name in [name for name in self.entries if name not in expected]:
+                del self.entries[file_name]
+            self._save()
+
+
+_TIMELINES = {}
+_TIMELINES_LOCK = threading.Lock()
+
+
+# One shared timeline per asset directory in this process
+def get_timeline(asset_dir):
+    key = os.path.abspath(asset_dir)
+    with _TIMELINES_LOCK:
+        if key not in _TIMELINES:
+            _TIMELINES[key] = TimelineManifest(asset_dir)
+        return _TIMELINES[key]
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local endpoint with the aggregate metrics of every job in this process; 0 turns it off
+METRICS_PORT = int(os.environ.get("JSONAV_METRICS_PORT", "9464"))
+METRICS_HOST = os.environ.get("JSONAV_METRICS_HOST", "127.0.0.1")
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+
+TRACE_FILE_NAME = "trace.json"
+
+
+def _label_text(labels):
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+# Process-wide counters and latency histograms, exported in the Prometheus text format
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[-1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [{"name": name, "labels": dict(labels), "buckets": dict(zip(self.buckets + ["+Inf"], values[:-1])),
+                           "count": sum(values[:-1]), "sum": values[-1]}
+                          for (name, labels), values in sorted(self._histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+        for counter in snapshot["counters"]:
+            if counter['name'] not in declared:
+                declared.add(counter['name'])
+                lines.append(f"# TYPE {counter['name']} counter")
+            lines.append(f"{counter['name']}{{{_label_text(counter['labels'])}}} {counter['value']}")
+        for histogram in snapshot["histograms"]:
+            name, labels = histogram["name"], histogram["labels"]
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f"{name}_bucket{{{_label_text(dict(labels, le=le))}}} {cumulative}")
+            lines.append(f"{name}_sum{{{_label_text(labels)}}} {histogram['sum']:.6f}")
+            lines.append(f"{name}_count{{{_label_text(labels)}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+# Spans of one job, exported in the Chrome trace format (chrome://tracing, ui.perfetto.dev).
+# Every span also feeds the process-wide metrics, so a tracer that keeps no events is still useful.
+class Tracer:
+    def __init__(self, job_id=None, keep_events=True, metrics=METRICS):
+        self.job_id = job_id
+        self.keep_events = keep_events
+        self.metrics = metrics
+        self.events = []
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def _track_id(self, track):
+        with self._lock:
+            if track not in self._tracks:
+                self._tracks[track] = len(self._tracks) + 1
+            return self._tracks[track]
+
+    # Time a block as a span. Spans run on the track of their thread unless `track` names another,
+    # for work that overlaps on one thread such as concurrent TTS lines. `log` prints the classic
+    # "<log> completed in N seconds." line when the span ends.
+    @contextmanager
+    def span(self, name, category="stage", track=None, log=None, **args):
+        track = track or threading.current_thread().name
+        start_time = time.time()
+        status = "ok"
+        try:
+            yield args
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            duration = time.time() - start_time
+            self.metrics.observe("jsonav_span_seconds", duration, span=name)
+            self.metrics.increment("jsonav_spans_total", span=name, status=status)
+            if self.keep_events:
+                event = {"name": name, "cat": category, "ph": "X", "ts": int(start_time * 1e6), "dur": int(duration * 1e6),
+                         "pid": os.getpid(), "tid": self._track_id(track), "args": dict(args, status=status)}
+                with self._lock:
+                    self.events.append(event)
+            if log:
+                print(f"{log} completed in {duration:.2f} seconds.", flush=True)
+
+    def chrome_trace(self):
+        with self._lock:
+            events = list(self.events)
+            tracks = dict(self._tracks)
+        metadata = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": f"JSONAV {self.job_id}"}}]
+        metadata += [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": track}}
+                     for track, tid in tracks.items()]
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        os.replace(tmp_path, path)
+        return path
+
+
+# For code running outside a job: spans only feed the metrics
+DETACHED_TRACER = Tracer(keep_events=False)
+
+
+def make_metrics_handler(metrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.rstrip('/')
+            if path == '/metrics':
+                body, content_type = metrics.prometheus_text().encode('utf-8'), 'text/plain; version=0.0.4'
+            elif path == '/metrics.json':
+                body, content_type = json.dumps(metrics.snapshot(), indent=2).encode('utf-8'), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MetricsHandler
+
+
+# Serve /metrics (Prometheus text) and /metrics.json from a daemon thread next to the Gradio app
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST, metrics=METRICS):
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), make_metrics_handler(metrics))
+    except OSError as e:
+        print(f"[ERROR] Could not start the metrics endpoint on {host}:{port}: {e}", flush=True)
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    print(f"Metrics available on http://{host}:{port}/metrics", flush=True)
+    return server
@@ -0,0 +1,166 @@
+import os
+import time
+import asyncio
+
+from tts_cache import TTS_CACHE, tts_cache_key
+from asset_manifest import get_asset_manifest, place_asset
+from timeline import get_timeline
+from still_encoder import probe_duration
+from audio_assembler import decode_pcm
+from tracing import DETACHED_TRACER, METRICS
+
+# Which backend synthesizes speech: "edge" (online edge-tts) or "tone" (offline stand-in)
+TTS_BACKEND = os.environ.get("JSONAV_TTS_BACKEND", "edge")
+
+# How many lines are synthesized at once, and how failed lines are retried
+TTS_CONCURRENCY = int(os.environ.get("JSONAV_TTS_CONCURRENCY", "4"))
+TTS_RETRIES = int(os.environ.get("JSONAV_TTS_RETRIES", "3"))
+TTS_BACKOFF_SECONDS = 1.0
+
+
+# Edge TTS, the default online voice service; edge_tts is imported when the backend is created
+class EdgeTTSBackend:
+    name = "edge"
+
+    def __init__(self):
+        import edge_tts
+        self._edge_tts = edge_tts
+        self.version = f"edge-tts-{getattr(edge_tts, '__version__', 'unknown')}"
+
+    async def synthesize(self, text, voice, path):
+        communicate = self._edge_tts.Communicate(text, voice)
+        await communicate.save(path)
+
+
+# Offline stand-in that writes a fixed-length tone for every line, for offline runs and benchmarks
+class ToneTTSBackend:
+    name = "tone"
+
+    def __init__(self, duration_seconds=2.0, frequency=440, latency_seconds=0.0):
+        self.duration_seconds = duration_seconds
+        self.frequency = frequency
+        self.latency_seconds = latency_seconds
+        self.version = f"tone-{duration_seconds}-{frequency}"
+
+    def _write(self, path):
+        from pydub.generators import Sine
+
+        tone = Sine(self.frequency).to_audio_segment(duration=int(self.duration_seconds * 1000)).apply_gain(-20)
+        tone.export(path, format="mp3")
+
+    async def synthesize(self, text, voice, path):
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        await asyncio.to_thread(self._write, path)
+
+
+TTS_BACKENDS = {
+    "edge": EdgeTTSBackend,
+    "tone": ToneTTSBackend,
+}
+
+
+def get_tts_backend(name=None):
+    name = name or TTS_BACKEND
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}', expected one of {sorted(TTS_BACKENDS)}")
+    return TTS_BACKENDS[name]()
+
+
+# Synthesize one line with retry and exponential backoff, returns True on success
+async def synthesize_line(backend, text, voice, path, retries=TTS_RETRIES, backoff=TTS_BACKOFF_SECONDS):
+    for attempt in range(retries + 1):
+        try:
+            await backend.synthesize(text, voice, path)
+            return True
+        except Exception as e:
+            if attempt == retries:
+                print(f"[ERROR] TTS failed for {os.path.basename(path)} after {attempt + 1} attempts: {e}", flush=True)
+                return False
+            delay = backoff * (2 ** attempt)
+            print(f"[ERROR] TTS attempt {attempt + 1} failed for {os.path.basename(path)}: {e}. Retrying in {delay:.1f}s", flush=True)
+            await asyncio.sleep(delay)
+
+
+# Synthesize (text, voice, file_name) lines concurrently into staging_dir and move them to organized_dir.
+# Lines whose text, voice and backend are unchanged since the last run are reused as they are, and
+# cached lines are linked straight into organized_dir without calling the TTS service.
+# Every line's duration is recorded in the directory's timeline for the stitcher.
+# Lines that keep failing are left out, and their outdated files removed, so the stitcher falls back to silence for them.
+# Every TTS call is a span of `tracer`, on its own track as lines overlap.
+# With an asset store, every line is also decoded to PCM while later stages are still running and
+# handed over in `store`, so a streaming encoder in this process does not decode it again.
+async def synthesize_lines(lines, staging_dir, organized_dir, backend=None, concurrency=TTS_CONCURRENCY, cache=TTS_CACHE,
+                           tracer=None, store=None):
+    backend = backend or get_tts_backend()
+    tracer = tracer or DETACHED_TRACER
+    manifest = get_asset_manifest(organized_dir)
+    timeline = get_timeline(organized_dir)
+    os.makedirs(staging_dir, exist_ok=True)
+    os.makedirs(organized_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(text, voice, file_name):
+        organized_path = os.path.join(organized_dir, file_name)
+        key = tts_cache_key(text, voice, backend.version)
+        if manifest.is_current(file_name, key):
+            print(f"TTS {file_name} is up to date", flush=True)
+            timeline.duration(file_name)
+            METRICS.increment("jsonav_tts_lines_total", source="current")
+            return True
+        manifest.discard(file_name)
+        timeline.forget(file_name)
+        duration = cache.fetch(key, organized_path) if cache is not None else None
+        if duration is not None:
+            print(f"TTS {file_name} served from cache", flush=True)
+            manifest.record(file_name, key)
+            timeline.record(file_name, duration)
+            METRICS.increment("jsonav_tts_lines_total", source="cache")
+            return True
+
+        async with semaphore:
+            start_time = time.time()
+            staging_path = os.path.join(staging_dir, file_name)
+            with tracer.span("tts", "tts", track=f"tts {file_name}", file=file_name, backend=backend.name):
+                ok = await synthesize_line(backend, text, voice, staging_path)
+            METRICS.increment("jsonav_tts_lines_total", source="synthesized" if ok else "failed")
+            if ok:
+                duration = None
+                if cache is not None:
+                    try:
+                        duration = await asyncio.to_thread(cache.store, key, staging_path, text, voice)
+                    except Exception as e:
+                        # Corrupt or empty audio is still handed to the stitcher, just never cached
+                        print(f"[ERROR] Could not cache TTS {file_name}: {e}", flush=True)
+                else:
+                    duration = probe_duration(staging_path)
+                place_asset(staging_path, organized_path, move=True)
+                manifest.record(file_name, key)
+                if duration is not None:
+                    timeline.record(file_name, duration)
+                print(f"Generated TTS {file_name} in {time.time() - start_time:.2f} seconds.", flush=True)
+            return ok
+
+    # Lines run concurrently, so two lines with the same file name would race for it; the last one
+    # wins, as it did when lines were synthesized one after another
+    unique = {}
+    for text, voice, file_name in lines:
+        if file_name in unique:
+            print(f"[ERROR] Two TTS lines share the file name {file_name}, keeping the last one", flush=True)
+        unique[file_name] = (text, voice)
+    lines = [(text, voice, file_name) for file_name, (text, voice) in unique.items()]
+
+    async def run_and_decode(text, voice, file_name):
+        ok = await run(text, voice, file_name)
+        if ok and store is not None:
+            organized_path = os.path.join(organized_dir, file_name)
+            pcm = await asyncio.to_thread(decode_pcm, organized_path)
+            if pcm is not None:
+                store.put(organized_path, pcm)
+        return ok
+
+    results = await asyncio.gather(*(run_and_decode(text, voice, file_name) for text, voice, file_name in lines))
+    if cache is not None:
+        stats = cache.stats()
+        print(f"TTS cache: {stats['hits']} hits, {stats['misses']} misses", flush=True)
+    return dict(zip((file_name for _, _, file_name in lines), results))
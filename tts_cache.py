@@ -0,0 +1,128 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+from still_encoder import probe_duration
+from asset_manifest import write_atomically
+
+# On-disk cache of synthesized speech, keyed by text, voice and backend version
+TTS_CACHE_DIR = os.environ.get("JSONAV_TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_GB = float(os.environ.get("JSONAV_TTS_CACHE_GB", "1"))
+
+# Share of the budget eviction frees the cache down to, so a full cache is not scanned on every store
+TTS_CACHE_LOW_WATER = 0.9
+
+
+def tts_cache_key(text, voice, backend_version):
+    payload = json.dumps([text, voice, backend_version], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Read from the MP3 frame headers, falling back to ffmpeg; unreadable audio is never cached
+def measure_duration(path):
+    duration = probe_duration(path)
+    if duration is None:
+        raise ValueError(f"Cannot read the duration of {path}")
+    return duration
+
+
+# Hardlink when possible so cached audio costs no extra disk, otherwise copy. Either way the file
+# appears under dest_path complete or not at all.
+def link_or_copy(src_path, dest_path):
+    def link(tmp_path):
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            shutil.copyfile(src_path, tmp_path)
+    write_atomically(dest_path, link)
+
+
+class TTSCache:
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_gb=TTS_CACHE_MAX_GB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_gb * 1024 ** 3)
+        self.hits = 0
+        self.misses = 0
+        self._bytes = None  # size of the cached audio, from the last scan plus what was stored since
+        self._lock = threading.Lock()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.mp3", f"{base}.json"
+
+    # Link or copy cached audio to dest_path and return its duration, or None on a miss
+    def fetch(self, key, dest_path):
+        audio_path, meta_path = self._paths(key)
+        with self._lock:
+            if not (os.path.exists(audio_path) and os.path.exists(meta_path)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            os.utime(audio_path)
+            with open(meta_path, 'r') as f:
+                duration = json.load(f)["duration"]
+        link_or_copy(audio_path, dest_path)
+        return duration
+
+    # Store an encoded MP3 along with its measured duration, returns the duration
+    def store(self, key, src_path, text="", voice=""):
+        audio_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+        duration = measure_duration(src_path)
+        suffix = f".tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(src_path, audio_path + suffix)
+        with open(meta_path + suffix, 'w') as f:
+            json.dump({"duration": duration, "voice": voice, "text": text}, f)
+        size = os.path.getsize(audio_path + suffix)
+        with self._lock:
+            replaced = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
+            os.replace(meta_path + suffix, meta_path)
+            os.replace(audio_path + suffix, audio_path)
+            if self._bytes is not None:
+                self._bytes += size - replaced
+            over_budget = self._bytes is None or self._bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+        return duration
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if not file_name.endswith(".mp3"):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    # Drop least recently used lines until the cache fits its disk budget, freeing it down to the low
+    # water mark once it is over. This stats every cached line, so store() only calls it when the size
+    # tracked in memory is over the budget or not known yet.
+    def evict(self):
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * TTS_CACHE_LOW_WATER if total > self.max_bytes else self.max_bytes
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                for stale in (path, path[:-len(".mp3")] + ".json"):
+                    try:
+                        os.remove(stale)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+            self._bytes = total
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+TTS_CACHE = TTSCache()